@@ -1,34 +1,70 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, stream_with_context
 from flask_bcrypt import Bcrypt
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt, get_jwt_identity
+from flask_jwt_extended import create_access_token, create_refresh_token, decode_token, jwt_required, get_jwt, get_jwt_identity
 from flask_cors import CORS
-from config import supabase
+from config import supabase, Config
+from revocation import RevocationCache, TokenGenerations
+from hashing import PasswordHasher, HashingBusy
+from token_cache import CachingJWTManager
+from sessions import RefreshSessionStore
+from maintenance import MaintenanceScheduler
+import listings
+from cache import ScopedCache, scope_key
+from conditional import CachedBody
+from fanout import AsyncFanout
+from changefeed import ChangeFeed
+from events import EventStream
+from changelog import ChangeLog
+from storage_buckets import BucketProvisioner
+from uploads import SpoolingRequest, apply_body_limit, upload_body
+from document_uploads import DocumentUploader, FileUpload
+from signed_uploads import SignedUploads, UploadSessionError
+from resumable_uploads import ResumableUploads, UploadError
 import datetime
-from uuid import UUID
+import itertools
+from uuid import UUID, uuid4
 import os
 import mimetypes
 import base64
 import secrets
 from dotenv import load_dotenv
+from werkzeug.exceptions import ClientDisconnected, RequestEntityTooLarge
 
 load_dotenv()
 
-app = Flask(__name__)
-bcrypt = Bcrypt(app)
-CORS(app, supports_credentials=True ,resources={r"/api/*": {"origins": ["http://localhost:5173"]}})
-app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
-app.config["JWT_ACCESS_TOKEN_EXPIRES"] = datetime.timedelta(hours=1)
-app.config["JWT_IDENTITY_CLAIM"] = "identity"
-app.config["JWT_TOKEN_LOCATION"] = ["headers"]
-app.config["JWT_HEADER_NAME"] = "Authorization"
-app.config["JWT_HEADER_TYPE"] = "Bearer"
-jwt = JWTManager(app)
+bcrypt = Bcrypt()
+jwt = CachingJWTManager()
+password_hasher = PasswordHasher(bcrypt)
+revocation_cache = RevocationCache(supabase)
+token_generations = TokenGenerations(supabase)
+refresh_sessions = RefreshSessionStore(supabase)
+maintenance = MaintenanceScheduler(supabase)
+fanout = AsyncFanout(Config.get_async_supabase_client)
+read_cache = ScopedCache(
+    ttl=int(os.getenv("READ_CACHE_TTL_SECONDS", "60")),
+    max_entries=int(os.getenv("READ_CACHE_MAX_ENTRIES", "10000"))
+)
+change_feed = ChangeFeed(supabase)
+event_stream = EventStream()
+change_log = ChangeLog(supabase)
+storage_buckets = BucketProvisioner(supabase)
+
+api = Blueprint('api', __name__)
 
 BUCKET_NAME = "project-documents"
+# Pública: los documentos se enlazan con get_public_url; tamaño y tipos MIME según STORAGE_*
+storage_buckets.bucket(BUCKET_NAME, public=True)
+document_uploader = DocumentUploader(storage_buckets, BUCKET_NAME)
+signed_uploads = SignedUploads(storage_buckets, BUCKET_NAME)
+resumable_uploads = ResumableUploads(storage_buckets, BUCKET_NAME)
+maintenance.task("upload_sessions", resumable_uploads.purge_expired)
+maintenance.task("signed_upload_sessions", signed_uploads.purge_abandoned)
+# Tipos de documento aceptados por POST /api/projects/<id>/documents (nombre del campo del formulario)
+DOCUMENT_ROLES = ("contract", "payment", "invoice", "deliverable", "other")
 
 
 # Ruta de registro
-@app.route('/api/register', methods=['POST'])
+@api.route('/api/register', methods=['POST'])
 def register():
     print("Request JSON:", request.json)
     data = request.json
@@ -43,9 +79,7 @@ def register():
     if role != 'client':  # Evitar que se creen administradores desde la API.
         return jsonify({"error": "No puedes registrarte como administrador"}), 403
 
-    hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
-
-    print(hashed_password)
+    hashed_password = password_hasher.generate_password_hash(password)
 
     try:
         response = supabase.table('users').insert({
@@ -59,7 +93,7 @@ def register():
         return jsonify({"error": str(e)}), 500
 
 # Ruta de login
-@app.route('/api/login', methods=['POST'])
+@api.route('/api/login', methods=['POST'])
 def login():
     data = request.json
     email = data.get('email')
@@ -69,34 +103,92 @@ def login():
         return jsonify({"error": "Todos los campos son obligatorios"}), 400
 
     try:
-        response = supabase.table('users').select('id, password, role').eq('email', email).execute()
+        response = supabase.table('users').select('id, password, role, token_generation').eq('email', email).execute()
         if response.data:
             user = response.data[0]
 
-            if bcrypt.check_password_hash(user['password'], password):
+            if password_hasher.check_password_hash(user['password'], password):
+                # Subir el costo de hashes antiguos sin bloquear la respuesta
+                if password_hasher.needs_rehash(user['password']):
+                    password_hasher.rehash_in_background(
+                        password,
+                        lambda new_hash, user_id=user["id"]: supabase.table('users').update({"password": new_hash}).eq('id', user_id).execute()
+                    )
                 try:
-                    access_token = create_access_token(
-                        identity={"id": user["id"], "role": user["role"]},
-                        additional_claims={"sub": str(user["id"])}  # Incluye el campo "sub" con el ID del usuario
-                        )
-                    return jsonify({"access_token": access_token, "user": {"id": user["id"], "role": user["role"]}})
-                except:
+                    # Cada login abre una nueva familia de refresh tokens (una por dispositivo)
+                    tokens = issue_session_tokens(user["id"], user["role"], str(uuid4()), user.get("token_generation") or 0)
+                    return jsonify({**tokens, "user": {"id": user["id"], "role": user["role"]}})
+                except Exception as e:
                     return jsonify({"error": f"Error al crear el token: {str(e)}"}), 500
         return jsonify({"error": "Credenciales inválidas"}), 401
+    except HashingBusy:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
 
+def issue_session_tokens(user_id, role, family_id, generation):
+    identity = {"id": user_id, "role": role}
+    # "sub" lleva el ID del usuario, "sid" la familia de refresh tokens de esta sesión
+    # y "gen" la generación de tokens del usuario al momento de emitirlos
+    claims = {"sub": str(user_id), "sid": family_id, "gen": generation}
+    refresh_jti = str(uuid4())
+
+    access_token = create_access_token(identity=identity, additional_claims=claims)
+    refresh_token = create_refresh_token(identity=identity, additional_claims={**claims, "jti": refresh_jti})
+    refresh_sessions.start(
+        refresh_jti, family_id, user_id,
+        datetime.datetime.utcnow() + current_app.config["JWT_REFRESH_TOKEN_EXPIRES"]
+    )
+    return {"access_token": access_token, "refresh_token": refresh_token}
+
+
+# Renueva el access token sin volver a pasar por bcrypt
+@api.route('/api/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh():
+    try:
+        jwt_payload = get_jwt()
+        current_user = get_jwt_identity()
+
+        status, _ = refresh_sessions.consume(jwt_payload["jti"])
+        if status == RefreshSessionStore.REUSED:
+            print(f"Refresh token reutilizado, familia {jwt_payload['sid']} revocada")
+            return jsonify({"error": "Sesión inválida, inicia sesión de nuevo"}), 401
+        if status != RefreshSessionStore.ROTATED:
+            return jsonify({"error": "Sesión inválida, inicia sesión de nuevo"}), 401
+
+        tokens = issue_session_tokens(
+            current_user["id"], current_user["role"], jwt_payload["sid"],
+            token_generations.current(current_user["id"])
+        )
+        return jsonify({**tokens, "user": current_user}), 200
+    except Exception as e:
+        print(f"Error in refresh: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
 # Ruta de logout
-@app.route('/api/logout', methods=['POST'])
+@api.route('/api/logout', methods=['POST'])
 @jwt_required()
 def logout():
     try:
         jwt_payload = get_jwt()
         jti = jwt_payload["jti"]  # Obtén el identificador único del token
-        
-        # Agregar el jti a la lista negra en Supabase
-        response = supabase.table("token_blacklist").insert({"jti": jti}).execute()
+
+        # Revocar en este proceso de inmediato; los demás lo verán en su próxima sincronización
+        revocation_cache.revoke(jti)
+
+        # Cerrar también la familia de refresh tokens de esta sesión
+        if jwt_payload.get("sid"):
+            refresh_sessions.revoke_family(jwt_payload["sid"])
+
+        # Agregar el jti a la lista negra en Supabase, con su expiración para poder purgarlo después
+        expires_at = datetime.datetime.fromtimestamp(jwt_payload["exp"], datetime.timezone.utc)
+        response = supabase.table("token_blacklist").insert({
+            "jti": jti,
+            "expires_at": expires_at.isoformat()
+        }).execute()
 
         # Verificar si se agregó correctamente a la base de datos
         if response.data:  # Si "data" no está vacío, la operación fue exitosa
@@ -108,8 +200,73 @@ def logout():
 
 
 
+# Cierra la sesión en todos los dispositivos del usuario
+@api.route('/api/logout-all', methods=['POST'])
+@jwt_required()
+def logout_all():
+    try:
+        current_user = get_jwt_identity()
+        token_generations.bump(current_user['id'])
+        return jsonify({"message": "Sesión cerrada en todos los dispositivos"}), 200
+    except Exception as e:
+        print(f"Error in logout_all: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+# Uso de los pools de conexiones hacia Supabase
+@api.route('/api/transport/stats', methods=['GET'])
+@jwt_required()
+def transport_stats():
+    current_user = get_jwt_identity()
+    if current_user['role'] != 'provider':
+        return jsonify({"error": "Unauthorized"}), 403
+    # Importado aquí para no cargar httpx en procesos que nunca tocan Supabase
+    from transport import pool_stats
+    return jsonify(pool_stats()), 200
+
+
+# Aciertos, fallos e invalidaciones del caché de lecturas
+@api.route('/api/cache/stats', methods=['GET'])
+@jwt_required()
+def cache_stats():
+    current_user = get_jwt_identity()
+    if current_user['role'] != 'provider':
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify(read_cache.stats()), 200
+
+
+# Estado de la suscripción a Supabase Realtime de este worker
+@api.route('/api/change-feed/status', methods=['GET'])
+@jwt_required()
+def change_feed_status():
+    current_user = get_jwt_identity()
+    if current_user['role'] != 'provider':
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify(change_feed.status()), 200
+
+
+# Suscriptores y eventos del stream /api/events de este worker
+@api.route('/api/events/status', methods=['GET'])
+@jwt_required()
+def event_stream_status():
+    current_user = get_jwt_identity()
+    if current_user['role'] != 'provider':
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify(event_stream.status()), 200
+
+
+# Resultado de la última purga de tablas de mantenimiento
+@api.route('/api/maintenance/status', methods=['GET'])
+@jwt_required()
+def maintenance_status():
+    current_user = get_jwt_identity()
+    if current_user['role'] != 'provider':
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify({"last_run": maintenance.last_report}), 200
+
+
 # Ruta del dashboard
-@app.route('/api/dashboard', methods=['GET'])
+@api.route('/api/dashboard', methods=['GET'])
 @jwt_required()
 def dashboard():
     # Obtener los datos del usuario del token
@@ -117,51 +274,195 @@ def dashboard():
     return jsonify({"message": f"Bienvenido, usuario {current_user['id']} con rol {current_user['role']}"})
 
 
-@app.route('/api/all-projects', methods=['GET'])
+@api.route('/api/all-projects', methods=['GET'])
 @jwt_required()
 def get_all_projects():
     try:
         current_user = get_jwt_identity()
-        
-        # If user is a client, only show their projects
-        if current_user['role'] == 'client':
-            projects_response = supabase.table("projects").select("*").eq("user_id", current_user['id']).execute()
-        else:
-            # If user is a provider, show all projects
-            projects_response = supabase.table("projects").select("*").execute()
-        
-        # If no projects, return a message
-        if not projects_response.data:
-            return jsonify({"message": "No hay proyectos disponibles"}), 200
-
-        # Get the users related to these projects
-        user_ids = list(set(project["user_id"] for project in projects_response.data if project["user_id"]))
-        users_response = supabase.table("users").select("id, name, email").in_("id", user_ids).execute()
-
-        if not users_response.data:
-            return jsonify({"error": "Error al obtener datos de usuarios"}), 500
-
-        users_dict = {user["id"]: user for user in users_response.data}
-        projects_with_users = [
-            {
-                "project_id": project["id"],
-                "project_name": project["name"],
-                "project_description": project["description"],
-                "project_status": project["status"],
-                "project_created_at": project["created_at"],
-                "user_id": project["user_id"],
-                "user_name": users_dict.get(project["user_id"], {}).get("name"),
-                "user_email": users_dict.get(project["user_id"], {}).get("email"),
-            }
-            for project in projects_response.data
-        ]
 
-        return jsonify(projects_with_users), 200
+        # Clients only see their projects, providers see all; owner data comes embedded
+        return list_response(
+            listings.PROJECTS, listings.client_scope(current_user),
+            empty_response=({"message": "No hay proyectos disponibles"}, 200),
+            namespace="projects"
+        )
 
     except Exception as e:
         print("Error interno:", str(e))
         return jsonify({"error": "Error interno del servidor"}), 500
 
+def cached_json(namespace, scope, loader, key=None):
+    # loader devuelve (datos, status); el cuerpo serializado y su ETag se guardan por scope
+    # y las visitas repetidas con If-None-Match reciben un 304 sin cuerpo
+    def load():
+        data, status = loader()
+        return CachedBody.from_data(data, current_app.json.dumps, status)
+
+    # Solo se guardan respuestas 200: un 404 no debe ocupar el caché
+    body = read_cache.get_or_load(namespace, scope, load, key, cacheable=lambda body: body.status == 200)
+    return body.response(request)
+
+# Lecturas cacheadas por dueño del proyecto (el cliente y todos los proveedores)
+PROJECT_OWNER_NAMESPACES = ("project_stats", "projects", "project", "user_projects")
+MESSAGE_OWNER_NAMESPACES = ("messages", "user_messages")
+# Lecturas cacheadas por proyecto
+PROJECT_NAMESPACES = ("project_documents", "project_updates", "project_messages", "project_bundle")
+
+def invalidate_project_reads(user_id, project_id=None):
+    # Un proyecto creado, cancelado o con nuevo estado
+    for namespace in PROJECT_OWNER_NAMESPACES:
+        read_cache.invalidate_owner(namespace, user_id)
+    if project_id is not None:
+        read_cache.invalidate("project_bundle", str(project_id))
+
+def invalidate_project_content(project_id, *namespaces):
+    # Contenido de un proyecto: documentos, actualizaciones o mensajes; el bundle los incluye a todos
+    for namespace in namespaces + ("project_bundle",):
+        read_cache.invalidate(namespace, str(project_id))
+
+def project_owner(project_id):
+    # El dueño de un proyecto no cambia: se cachea hasta que el proyecto se cancela
+    response = read_cache.get_or_load(
+        "project_owner", str(project_id),
+        lambda: supabase.table('projects').select('user_id').eq('id', project_id).execute(),
+        cacheable=lambda response: bool(response.data)
+    )
+    return response.data[0]['user_id'] if response.data else None
+
+def publish_project_event(project_id, event_type, data, key=None, version=None, owner_id=None):
+    # Evento en vivo (/api/events) para el dueño del proyecto y los proveedores
+    if not event_stream.enabled:
+        return
+    if owner_id is None:
+        owner_id = project_owner(project_id)
+    if owner_id is not None:
+        event_stream.publish(owner_id, event_type, data, key=key, version=version)
+
+def publish_project_status(project):
+    # La versión es el estado: el mismo cambio visto otra vez en el canal de cambios no se reenvía
+    publish_project_event(
+        project['id'], "project_status",
+        {"project_id": project['id'], "name": project.get('name'), "status": project['status']},
+        key=f"project_status:{project['id']}", version=project['status'], owner_id=project['user_id']
+    )
+
+def publish_row_event(event_type, row, owner_id=None):
+    # Mensajes y actualizaciones: una fila nueva se envía una sola vez (clave = id)
+    key = f"{event_type}:{row['id']}" if row.get('id') is not None else None
+    publish_project_event(row['project_id'], event_type, row, key=key, owner_id=owner_id)
+
+# Cambios hechos por otros workers o fuera de esta app, recibidos por Supabase Realtime
+@change_feed.handler("projects")
+def on_project_change(event, record, old_record):
+    project = record or old_record or {}
+    if event == ChangeFeed.RESYNC or project.get("user_id") is None:
+        # Sin la fila completa (p. ej. DELETE sin REPLICA IDENTITY FULL) no se sabe a quién afecta
+        for namespace in PROJECT_OWNER_NAMESPACES + PROJECT_NAMESPACES + MESSAGE_OWNER_NAMESPACES:
+            read_cache.invalidate_namespace(namespace)
+        return
+    invalidate_project_reads(project["user_id"], project.get("id"))
+    if event == "UPDATE" and record.get("status") and (old_record or {}).get("status") != record["status"]:
+        publish_project_status(record)
+    if old_record and old_record.get("user_id") not in (None, project["user_id"]):
+        invalidate_project_reads(old_record["user_id"])
+    if event == "DELETE":
+        invalidate_project_content(project["id"], *PROJECT_NAMESPACES)
+        read_cache.invalidate("project_owner", str(project["id"]))
+
+def _project_content_handler(namespace, owner_namespaces=(), event_type=None):
+    def handle(event, record, old_record):
+        project_id = (record or old_record or {}).get("project_id")
+        if event == ChangeFeed.RESYNC or project_id is None:
+            for name in (namespace, "project_bundle") + owner_namespaces:
+                read_cache.invalidate_namespace(name)
+            return
+        invalidate_project_content(project_id, namespace)
+        if owner_namespaces:
+            owner_id = project_owner(project_id)
+            for name in owner_namespaces:
+                read_cache.invalidate_owner(name, owner_id)
+        if event_type and event == "INSERT":
+            publish_row_event(event_type, record)
+    return handle
+
+change_feed.handler("messages", resync_column="created_at")(
+    _project_content_handler("project_messages", MESSAGE_OWNER_NAMESPACES, event_type="message")
+)
+change_feed.handler("progress_updates", resync_column="created_at")(
+    _project_content_handler("project_updates", event_type="progress_update")
+)
+change_feed.handler("contracts", resync_column="created_at")(_project_content_handler("project_documents"))
+
+@change_feed.handler("users")
+def on_user_change(event, record, old_record):
+    if event == ChangeFeed.RESYNC:
+        token_generations.sync()
+        for namespace in ("projects", "messages"):
+            read_cache.invalidate_namespace(namespace)
+        return
+    if not record:
+        return
+    if record.get("token_generation"):
+        token_generations.observe(record["id"], record["token_generation"])
+    # Las listas de proyectos y mensajes incluyen el nombre y correo del dueño
+    unchanged = old_record and all(
+        field in old_record and old_record[field] == record.get(field) for field in ("name", "email")
+    )
+    if event == "UPDATE" and not unchanged:
+        for namespace in ("projects", "messages"):
+            read_cache.invalidate_owner(namespace, record["id"])
+
+@change_feed.handler("token_blacklist")
+def on_token_revoked(event, record, old_record):
+    if event == ChangeFeed.RESYNC:
+        revocation_cache.sync()
+    elif event == "INSERT" and record:
+        revocation_cache.revoke(record["jti"])
+
+def list_response(listing, scope, empty_response=None, namespace=None):
+    # ?stream=1 streams the whole list page by page in bounded memory
+    if listings.stream_requested(request.args):
+        pages = listing.iter_pages(supabase, scope)
+        # The first two pages are fetched eagerly: their query errors still become a 500,
+        # and a listing that fits in one page is answered as without ?stream=1
+        first_page = next(pages)
+        second_page = next(pages, None)
+        if second_page is None:
+            if not first_page and empty_response is not None:
+                return jsonify(empty_response[0]), empty_response[1]
+            return jsonify(first_page), 200
+
+        def on_error(e):
+            print(f"Error streaming {request.path}, list truncated: {str(e)}")
+
+        body = listings.iter_json_array(
+            itertools.chain([first_page, second_page], pages), current_app.json.dumps, on_error=on_error
+        )
+        return Response(stream_with_context(body), mimetype='application/json')
+
+    # With ?limit= or ?cursor= answer one keyset page, otherwise the full list as before
+    try:
+        page = listings.page_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def load():
+        if page is None:
+            rows = listing.fetch(supabase, scope)
+            if not rows and empty_response is not None:
+                return empty_response
+            return rows, 200
+
+        limit, cursor = page
+        rows, next_cursor = listing.page(supabase, scope, limit, cursor)
+        return {"data": rows, "next_cursor": next_cursor}, 200
+
+    # With a cache namespace the serialized list (or page) is cached per scope with an ETag
+    if namespace is not None:
+        return cached_json(namespace, scope_key(scope), load, key=page)
+    data, status = load()
+    return jsonify(data), status
+
 def is_valid_uuid(uuid_string):
     try:
         UUID(uuid_string)
@@ -169,49 +470,9 @@ def is_valid_uuid(uuid_string):
     except ValueError:
         return False
     
-def ensure_bucket_exists():
-    try:
-        # List all buckets
-        buckets = supabase.storage.list_buckets()
-        bucket_exists = any(bucket.name == BUCKET_NAME for bucket in buckets)
-        
-        if not bucket_exists:
-            # Create the bucket if it doesn't exist
-            supabase.storage.create_bucket(BUCKET_NAME, options={'public': True})
-            print(f"Created bucket: {BUCKET_NAME}")
-        
-        return True
-    except Exception as e:
-        print(f"Error ensuring bucket exists: {str(e)}")
-        return False
-
-def upload_file_to_storage(file_data, file_name):
-    try:
-        # Ensure bucket exists
-        if not ensure_bucket_exists():
-            raise Exception("Failed to ensure bucket exists")
-
-        # Get file extension and content type
-        content_type = mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
-        
-        # Upload to Supabase Storage
-        response = supabase.storage.from_(BUCKET_NAME).upload(
-            path=file_name,
-            file=file_data,
-            file_options={"content-type": content_type}
-        )
-        
-        # Get public URL
-        file_url = supabase.storage.from_(BUCKET_NAME).get_public_url(file_name)
-        return file_url
-    except Exception as e:
-        print(f"Error uploading file: {str(e)}")
-        raise e 
-
-
-
-@app.route('/api/projects/<string:project_id>/upload-documents', methods=['POST', 'OPTIONS'])
+@api.route('/api/projects/<string:project_id>/upload-documents', methods=['POST', 'OPTIONS'])
 @jwt_required()
+@upload_body('UPLOAD_MAX_CONTENT_LENGTH')
 def upload_project_documents(project_id):
     if request.method == 'OPTIONS':
         return '', 200
@@ -242,69 +503,426 @@ def upload_project_documents(project_id):
         contract_filename = f"{project_id}_contract_{timestamp}{os.path.splitext(contract_file.filename)[1]}"
         payment_filename = f"{project_id}_payment_{timestamp}{os.path.splitext(payment_file.filename)[1]}"
 
-        # Upload files to Supabase Storage
-        contract_url = upload_file_to_storage(contract_file.read(), contract_filename)
-        payment_url = upload_file_to_storage(payment_file.read(), payment_filename)
+        # Upload both files to Supabase Storage concurrently, streamed from the spooled parts
+        uploads = [
+            FileUpload("contract", contract_file, contract_filename),
+            FileUpload("payment", payment_file, payment_filename)
+        ]
+        if not document_uploader.upload(uploads):
+            return jsonify({
+                "error": "Error al subir los documentos",
+                "files": [upload.to_dict() for upload in uploads]
+            }), 500
 
         # Create contract record
         contract_data = {
             "project_id": project_id,
-            "contract_url": contract_url,
-            "payment_url": payment_url,
+            "contract_url": uploads[0].url,
+            "payment_url": uploads[1].url,
             "created_at": datetime.datetime.utcnow().isoformat()
         }
 
-        response = supabase.table('contracts').insert(contract_data).execute()
+        try:
+            response = supabase.table('contracts').insert(contract_data).execute()
+        except Exception:
+            document_uploader.discard(uploads)
+            raise
 
         if response.data:
+            invalidate_project_content(project_id, "project_documents")
+            change_log.append([ChangeLog.entry("contract", response.data[0], project_response.data[0]['user_id'])])
             return jsonify({
                 "message": "Documentos subidos exitosamente",
                 "contract": response.data[0]
             }), 201
         else:
+            document_uploader.discard(uploads)
             return jsonify({"error": "Error al guardar los documentos en la base de datos"}), 500
 
+    except RequestEntityTooLarge:
+        return jsonify({"error": "Los archivos superan el tamaño máximo permitido"}), 413
     except Exception as e:
         print(f"Error in upload_project_documents: {str(e)}")
         return jsonify({"error": str(e)}), 500
+
+def document_declaration_error(role, declared):
+    # Validates a file announced before a direct upload; the bucket enforces the same limits on the bytes
+    if not isinstance(declared, dict) or not declared.get('filename'):
+        return f"Falta el nombre del archivo {role}"
+    options = storage_buckets.options(BUCKET_NAME)
+    content_type = mimetypes.guess_type(declared['filename'])[0]
+    if options["allowed_mime_types"] and content_type not in options["allowed_mime_types"]:
+        return f"Tipo de archivo no permitido para {role}"
+    size = declared.get('size')
+    if size is not None and (not isinstance(size, int) or size <= 0 or size > options["file_size_limit"]):
+        return f"El archivo {role} supera el tamaño máximo permitido"
+    return None
+
+# Subida directa a Storage en dos pasos: init entrega URLs firmadas, el navegador sube los archivos
+# con PUT a cada una y complete verifica que estén en el bucket antes de crear el contrato
+@api.route('/api/projects/<string:project_id>/upload-documents/init', methods=['POST'])
+@jwt_required()
+def init_project_documents_upload(project_id):
+    if not is_valid_uuid(project_id):
+        return jsonify({"error": "ID de proyecto inválido"}), 400
+
+    try:
+        current_user = get_jwt_identity()
+        data = request.get_json(silent=True) or {}
+
+        if 'contract' not in data or 'payment' not in data:
+            return jsonify({"error": "Se requieren ambos archivos: contrato y comprobante de pago"}), 400
+        for role in ('contract', 'payment'):
+            error = document_declaration_error(role, data[role])
+            if error:
+                return jsonify({"error": error}), 400
+
+        owner_id = project_owner(project_id)
+        if owner_id is None:
+            return jsonify({"error": "Proyecto no encontrado"}), 404
+        if current_user['role'] == 'client' and owner_id != current_user['id']:
+            return jsonify({"error": "No tienes permiso para subir documentos a este proyecto"}), 403
+
+        session = signed_uploads.init(project_id, current_user['id'], [
+            {"role": role, "filename": data[role]['filename']} for role in ('contract', 'payment')
+        ])
+        return jsonify(session), 201
+
+    except Exception as e:
+        print(f"Error in init_project_documents_upload: {str(e)}")
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+@api.route('/api/projects/<string:project_id>/upload-documents/complete', methods=['POST'])
+@jwt_required()
+def complete_project_documents_upload(project_id):
+    if not is_valid_uuid(project_id):
+        return jsonify({"error": "ID de proyecto inválido"}), 400
+
+    try:
+        current_user = get_jwt_identity()
+        data = request.get_json(silent=True) or {}
+        if not data.get('session'):
+            return jsonify({"error": "Falta la sesión de subida"}), 400
+
+        try:
+            files = signed_uploads.complete(data['session'], project_id, current_user['id'])
+        except UploadSessionError as e:
+            if e.missing:
+                return jsonify({"error": str(e), "missing": e.missing}), 409
+            return jsonify({"error": str(e)}), 400
+
+        owner_id = project_owner(project_id)
+        if owner_id is None:
+            return jsonify({"error": "Proyecto no encontrado"}), 404
+
+        # Repetir complete con la misma sesión devuelve el contrato ya creado
+        existing = supabase.table('contracts').select('*').eq('project_id', project_id) \
+            .eq('contract_url', files['contract']['url']).limit(1).execute()
+        if existing.data:
+            return jsonify({
+                "message": "Documentos subidos exitosamente",
+                "contract": existing.data[0]
+            }), 200
+
+        response = supabase.table('contracts').insert({
+            "project_id": project_id,
+            "contract_url": files['contract']['url'],
+            "payment_url": files['payment']['url'],
+            "created_at": datetime.datetime.utcnow().isoformat()
+        }).execute()
+        if not response.data:
+            return jsonify({"error": "Error al guardar los documentos en la base de datos"}), 500
+
+        invalidate_project_content(project_id, "project_documents")
+        change_log.append([ChangeLog.entry("contract", response.data[0], owner_id)])
+        return jsonify({
+            "message": "Documentos subidos exitosamente",
+            "contract": response.data[0],
+            "files": files
+        }), 201
+
+    except Exception as e:
+        print(f"Error in complete_project_documents_upload: {str(e)}")
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+# Varios documentos por proyecto, cada uno con su tipo: contract=@a.pdf, other=@b.png, other=@c.pdf...
+@api.route('/api/projects/<string:project_id>/documents', methods=['POST'])
+@jwt_required()
+@upload_body('UPLOAD_MAX_CONTENT_LENGTH')
+def add_project_documents(project_id):
+    if not is_valid_uuid(project_id):
+        return jsonify({"error": "ID de proyecto inválido"}), 400
+
+    try:
+        current_user = get_jwt_identity()
+
+        unknown = sorted(set(request.files) - set(DOCUMENT_ROLES))
+        if unknown:
+            return jsonify({"error": f"Tipos de documento inválidos: {', '.join(unknown)}"}), 400
+
+        parts = [(role, file) for role in DOCUMENT_ROLES for file in request.files.getlist(role)]
+        if not parts:
+            return jsonify({"error": "No se enviaron documentos"}), 400
+        if len(parts) > current_app.config["UPLOAD_MAX_FILES"]:
+            return jsonify({"error": f"Máximo {current_app.config['UPLOAD_MAX_FILES']} documentos por solicitud"}), 400
+        if any(not file.filename for _, file in parts):
+            return jsonify({"error": "Los archivos no tienen nombre"}), 400
+
+        owner_id = project_owner(project_id)
+        if owner_id is None:
+            return jsonify({"error": "Proyecto no encontrado"}), 404
+        if current_user['role'] == 'client' and owner_id != current_user['id']:
+            return jsonify({"error": "No tienes permiso para subir documentos a este proyecto"}), 403
+
+        # upload_id identifica los eventos de progreso en /api/events (el cliente puede enviarlo)
+        upload_id = request.form.get('upload_id') or uuid4().hex
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        uploads = [
+            FileUpload(role, file, f"{project_id}_{role}_{timestamp}_{uuid4().hex[:8]}{os.path.splitext(file.filename)[1]}")
+            for role, file in parts
+        ]
+
+        def on_progress(upload):
+            publish_project_event(project_id, "document_upload", {"upload_id": upload_id, **upload.to_dict()},
+                                  owner_id=owner_id)
+
+        if not document_uploader.upload(uploads, on_progress):
+            return jsonify({
+                "error": "No se pudieron subir todos los documentos",
+                "upload_id": upload_id,
+                "files": [upload.to_dict() for upload in uploads]
+            }), 500
+
+        # Un solo insert para todo el lote; si falla, los archivos se borran de Storage
+        now = datetime.datetime.utcnow().isoformat()
+        rows = [{
+            "project_id": project_id,
+            "role": upload.role,
+            "file_name": upload.filename,
+            "path": upload.path,
+            "url": upload.url,
+            "content_type": upload.content_type,
+            "size": upload.size,
+            "created_at": now
+        } for upload in uploads]
+        try:
+            response = supabase.table('project_documents').insert(rows).execute()
+        except Exception:
+            document_uploader.discard(uploads, on_progress)
+            raise
+        if not response.data:
+            document_uploader.discard(uploads, on_progress)
+            return jsonify({"error": "Error al guardar los documentos en la base de datos"}), 500
+
+        invalidate_project_content(project_id, "project_documents")
+        change_log.append([ChangeLog.entry("project_document", row, owner_id) for row in response.data])
+        return jsonify({
+            "message": "Documentos subidos exitosamente",
+            "upload_id": upload_id,
+            "files": [upload.to_dict() for upload in uploads],
+            "documents": response.data
+        }), 201
+
+    except RequestEntityTooLarge:
+        return jsonify({"error": "Los archivos superan el tamaño máximo permitido"}), 413
+    except Exception as e:
+        print(f"Error in add_project_documents: {str(e)}")
+        return jsonify({"error": "Error interno del servidor"}), 500
     
-@app.route('/api/projects/count', methods=['GET'])
+# Subidas reanudables: se crea la sesión, se envían partes con PUT y su offset, y al final se pasa a Storage
+def upload_error_response(error):
+    body = {"error": str(error)}
+    if error.offset is not None:
+        body["offset"] = error.offset
+    return jsonify(body), error.status
+
+@api.route('/api/projects/<string:project_id>/uploads', methods=['POST'])
+@jwt_required()
+def create_resumable_upload(project_id):
+    if not is_valid_uuid(project_id):
+        return jsonify({"error": "ID de proyecto inválido"}), 400
+
+    try:
+        current_user = get_jwt_identity()
+        data = request.get_json(silent=True) or {}
+
+        role = data.get('role')
+        if role not in DOCUMENT_ROLES:
+            return jsonify({"error": "Tipo de documento inválido"}), 400
+        if not isinstance(data.get('size'), int):
+            return jsonify({"error": "Falta el tamaño del archivo"}), 400
+        error = document_declaration_error(role, data)
+        if error:
+            return jsonify({"error": error}), 400
+
+        owner_id = project_owner(project_id)
+        if owner_id is None:
+            return jsonify({"error": "Proyecto no encontrado"}), 404
+        if current_user['role'] == 'client' and owner_id != current_user['id']:
+            return jsonify({"error": "No tienes permiso para subir documentos a este proyecto"}), 403
+
+        upload = resumable_uploads.create(project_id, current_user['id'], role, data['filename'], data['size'])
+        response = jsonify(upload)
+        response.headers['Location'] = f"/api/projects/{project_id}/uploads/{upload['upload_id']}"
+        return response, 201
+
+    except Exception as e:
+        print(f"Error in create_resumable_upload: {str(e)}")
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+@api.route('/api/projects/<string:project_id>/uploads/<string:upload_id>', methods=['GET'])
+@jwt_required()
+def get_resumable_upload(project_id, upload_id):
+    try:
+        return jsonify(resumable_uploads.status(upload_id, project_id, get_jwt_identity()['id'])), 200
+    except UploadError as e:
+        return upload_error_response(e)
+    except Exception as e:
+        print(f"Error in get_resumable_upload: {str(e)}")
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+# Cuerpo: los bytes de la parte; offset en el header Upload-Offset (o ?offset=)
+@api.route('/api/projects/<string:project_id>/uploads/<string:upload_id>', methods=['PUT'])
+@jwt_required()
+@upload_body('UPLOAD_CHUNK_MAX_BYTES')
+def put_resumable_upload_chunk(project_id, upload_id):
+    offset = request.headers.get('Upload-Offset', request.args.get('offset'))
+    if offset is None or not offset.isdigit():
+        return jsonify({"error": "Falta el offset de la parte"}), 400
+    if request.content_length is None:
+        return jsonify({"error": "Se requiere Content-Length"}), 411
+
+    try:
+        upload = resumable_uploads.append(
+            upload_id, project_id, get_jwt_identity()['id'], int(offset), request.stream, request.content_length
+        )
+        return jsonify(upload), 200
+    except UploadError as e:
+        return upload_error_response(e)
+    except ClientDisconnected:
+        # Lo recibido queda guardado; el cliente consulta el offset y reanuda
+        print(f"Client disconnected during chunk of upload {upload_id}")
+        return jsonify({"error": "Conexión interrumpida"}), 400
+    except RequestEntityTooLarge:
+        return jsonify({"error": "La parte supera el tamaño máximo permitido"}), 413
+    except Exception as e:
+        print(f"Error in put_resumable_upload_chunk: {str(e)}")
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+@api.route('/api/projects/<string:project_id>/uploads/<string:upload_id>', methods=['DELETE'])
+@jwt_required()
+def delete_resumable_upload(project_id, upload_id):
+    try:
+        resumable_uploads.cancel(upload_id, project_id, get_jwt_identity()['id'])
+        return '', 204
+    except UploadError as e:
+        return upload_error_response(e)
+    except Exception as e:
+        print(f"Error in delete_resumable_upload: {str(e)}")
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+@api.route('/api/projects/<string:project_id>/uploads/<string:upload_id>/complete', methods=['POST'])
+@jwt_required()
+def complete_resumable_upload(project_id, upload_id):
+    if not is_valid_uuid(project_id):
+        return jsonify({"error": "ID de proyecto inválido"}), 400
+
+    try:
+        current_user = get_jwt_identity()
+        session = resumable_uploads.status(upload_id, project_id, current_user['id'])
+        # Ruta fija por sesión: reintentar complete sobrescribe el mismo objeto
+        path = f"{project_id}_{session['role']}_{upload_id}{os.path.splitext(session['filename'])[1]}"
+        created = []
+
+        def record(upload):
+            # Bajo el bloqueo de la sesión: un complete concurrente o repetido encuentra la fila ya creada
+            existing = supabase.table('project_documents').select('*').eq('project_id', project_id) \
+                .eq('path', upload['path']).limit(1).execute()
+            if existing.data:
+                return existing.data[0]
+            try:
+                response = supabase.table('project_documents').insert({
+                    "project_id": project_id,
+                    "role": upload['role'],
+                    "file_name": upload['filename'],
+                    "path": upload['path'],
+                    "url": upload['url'],
+                    "content_type": upload['content_type'],
+                    "size": upload['size'],
+                    "created_at": datetime.datetime.utcnow().isoformat()
+                }).execute()
+            except Exception as e:
+                print(f"Error inserting document of upload {upload_id}: {str(e)}")
+                response = None
+            if not response or not response.data:
+                # La copia local se conserva hasta que expire: complete puede reintentarse
+                try:
+                    storage_buckets.call(BUCKET_NAME, lambda bucket: bucket.remove([path]))
+                except Exception as e:
+                    print(f"Error removing {path} after failed insert: {str(e)}")
+                return None
+            created.append(response.data[0])
+            return response.data[0]
+
+        _, document = resumable_uploads.complete(upload_id, project_id, current_user['id'], path, record)
+        if not document:
+            return jsonify({"error": "Error al guardar el documento en la base de datos"}), 500
+
+        if created:
+            invalidate_project_content(project_id, "project_documents")
+            change_log.append([ChangeLog.entry("project_document", document, project_owner(project_id))])
+        return jsonify({
+            "message": "Documento subido exitosamente",
+            "document": document
+        }), 201 if created else 200
+
+    except UploadError as e:
+        return upload_error_response(e)
+    except Exception as e:
+        print(f"Error in complete_resumable_upload: {str(e)}")
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+@api.route('/api/projects/count', methods=['GET'])
 @jwt_required()
 def get_project_count():
     try:
-        response = supabase.table('projects').select('id', count='exact').execute()
+        response = supabase.table('projects').select('id', count='exact').limit(0).execute()
         return jsonify({"count": response.count}), 200
     except Exception as e:
         print(f"Error in get_project_count: {str(e)}")
         return jsonify({"error": str(e)}), 500
     
 
+# Conteo total y por estado de los proyectos visibles para el usuario
+@api.route('/api/projects/stats', methods=['GET'])
+@jwt_required()
+def get_project_stats():
+    try:
+        user_id = listings.client_scope(get_jwt_identity())
+        stats = read_cache.get_or_load(
+            "project_stats", scope_key(user_id),
+            lambda: listings.project_status_counts(fanout, user_id)
+        )
+        return jsonify(stats), 200
+    except Exception as e:
+        print(f"Error in get_project_stats: {str(e)}")
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+
 # Get user's messages
-@app.route('/api/messages/user', methods=['GET'])
+@api.route('/api/messages/user', methods=['GET'])
 @jwt_required()
 def get_user_messages():
     current_user = get_jwt_identity()
     try:
-        # Get user's projects first
-        projects_response = supabase.table('projects').select('id').eq('user_id', current_user['id']).execute()
-        
-        if not projects_response.data:
-            return jsonify([])
-
-        project_ids = [project['id'] for project in projects_response.data]
-        
-        # Get messages for these projects
-        messages_response = supabase.table('messages').select(
-            'id, content, type, created_at, project_id, projects(name)'
-        ).in_('project_id', project_ids).execute()
-
-        return jsonify(messages_response.data)
+        # Messages of the user's projects, filtered through the embedded project
+        return list_response(listings.USER_MESSAGES, current_user['id'], namespace="user_messages")
     except Exception as e:
         print("Error in get_user_messages:", str(e))
         return jsonify({"error": str(e)}), 500
 
 # Create a new message
-@app.route('/api/messages', methods=['POST'])
+@api.route('/api/messages', methods=['POST'])
 @jwt_required()
 def create_message():
     current_user = get_jwt_identity()
@@ -327,23 +945,32 @@ def create_message():
         if not response.data:
             raise Exception("Error creating message")
 
+        invalidate_project_content(data['project_id'], "project_messages")
+        owner_id = project_owner(data['project_id'])
+        for namespace in MESSAGE_OWNER_NAMESPACES:
+            read_cache.invalidate_owner(namespace, owner_id)
+        publish_row_event("message", response.data[0], owner_id=owner_id)
+        change_log.append([ChangeLog.entry("message", response.data[0], owner_id)])
+
         return jsonify({"message": "Message created successfully", "data": response.data[0]}), 201
     except Exception as e:
         print("Error in create_message:", str(e))
         return jsonify({"error": str(e)}), 500
     
-@app.route('/api/projects/user', methods=['GET'])
+@api.route('/api/projects/user', methods=['GET'])
 @jwt_required()
 def get_user_projects():
     current_user = get_jwt_identity()
     try:
-        response = supabase.table('projects').select('*').eq('user_id', current_user['id']).execute()
-        return jsonify(response.data)
+        return cached_json(
+            "user_projects", scope_key(current_user['id']),
+            lambda: (supabase.table('projects').select('*').eq('user_id', current_user['id']).execute().data, 200)
+        )
     except Exception as e:
         print("Error in get_user_projects:", str(e))
         return jsonify({"error": str(e)}), 500
     
-@app.route('/api/messages/broadcast', methods=['POST'])
+@api.route('/api/messages/broadcast', methods=['POST'])
 @jwt_required()
 def broadcast_message():
     current_user = get_jwt_identity()
@@ -357,7 +984,7 @@ def broadcast_message():
             return jsonify({"error": "El contenido del mensaje es requerido"}), 400
             
         # Get all projects
-        projects_response = supabase.table('projects').select('id').execute()
+        projects_response = supabase.table('projects').select('id, user_id').execute()
         if not projects_response.data:
             return jsonify({"error": "No hay proyectos disponibles"}), 404
             
@@ -374,7 +1001,18 @@ def broadcast_message():
             
         # Insert all messages at once
         response = supabase.table('messages').insert(messages).execute()
-        
+
+        # Un mensaje en cada proyecto: todas las vistas de mensajes quedan obsoletas
+        for namespace in MESSAGE_OWNER_NAMESPACES + ("project_messages", "project_bundle"):
+            read_cache.invalidate_namespace(namespace)
+
+        owners = {project['id']: project['user_id'] for project in projects_response.data}
+        for message in response.data or []:
+            publish_row_event("message", message, owner_id=owners.get(message['project_id']))
+        change_log.append([
+            ChangeLog.entry("message", message, owners.get(message['project_id'])) for message in response.data or []
+        ])
+
         return jsonify({"message": "Mensajes enviados exitosamente"}), 201
         
     except Exception as e:
@@ -383,69 +1021,29 @@ def broadcast_message():
 
 
 # Messages routes
-@app.route('/api/messages', methods=['GET'])
+@api.route('/api/messages', methods=['GET'])
 @jwt_required()
 def get_messages():
     try:
         current_user = get_jwt_identity()
-        
-        if current_user['role'] == 'client':
-            # Get projects for this client
-            projects = supabase.table('projects').select('id').eq('user_id', current_user['id']).execute()
-            if not projects.data:
-                return jsonify([])
-            
-            project_ids = [p['id'] for p in projects.data]
-            messages = supabase.table('messages').select('*').in_('project_id', project_ids).execute()
-        else:
-            # Provider sees all messages
-            messages = supabase.table('messages').select('*').execute()
-        
-        if not messages.data:
-            return jsonify([])
-
-        # Get project details for each message
-        project_ids = list(set(msg['project_id'] for msg in messages.data))
-        projects = supabase.table('projects').select('*').in_('id', project_ids).execute()
-        projects_dict = {p['id']: p for p in projects.data}
-
-        # Format messages with project details
-        formatted_messages = []
-        for msg in messages.data:
-            project = projects_dict.get(msg['project_id'], {})
-            formatted_messages.append({
-                'id': msg['id'],
-                'content': msg['content'],
-                'type': msg['type'],
-                'sender_id': msg['sender_id'],
-                'created_at': msg['created_at'],
-                'project': {
-                    'name': project.get('name', 'Unknown Project'),
-                    'user_name': project.get('user_name', 'Unknown User')
-                }
-            })
-
-        return jsonify(formatted_messages)
+
+        # Clients see messages of their projects, providers see all; project and owner come embedded
+        return list_response(listings.MESSAGES, listings.client_scope(current_user), namespace="messages")
 
     except Exception as e:
         print(f"Error in get_messages: {str(e)}")
         return jsonify({"error": "Error interno del servidor"}), 500
     
-@app.route('/api/projects/<project_id>/updates', methods=['GET'])
+@api.route('/api/projects/<project_id>/updates', methods=['GET'])
 @jwt_required()
 def get_project_updates(project_id):
     try:
-        response = supabase.table('progress_updates').select('*').eq('project_id', project_id).order('created_at', desc=True).execute()
-        
-        if not response.data:
-            return jsonify([])
-            
-        return jsonify(response.data)
+        return list_response(listings.PROJECT_UPDATES, project_id, namespace="project_updates")
     except Exception as e:
         print(f"Error in get_project_updates: {str(e)}")
         return jsonify({"error": "Error interno del servidor"}), 500
 
-@app.route('/api/projects/<project_id>/updates', methods=['POST'])
+@api.route('/api/projects/<project_id>/updates', methods=['POST'])
 @jwt_required()
 def add_project_update(project_id):
     try:
@@ -464,50 +1062,154 @@ def add_project_update(project_id):
         if not response.data:
             return jsonify({"error": "Error al crear la actualización"}), 500
 
+        invalidate_project_content(project_id, "project_updates")
+        publish_row_event("progress_update", response.data[0])
+        if change_log.enabled:
+            change_log.append([ChangeLog.entry("progress_update", response.data[0], project_owner(project_id))])
+
         return jsonify(response.data[0]), 201
     except Exception as e:
         print(f"Error in add_project_update: {str(e)}")
         return jsonify({"error": "Error interno del servidor"}), 500
 
-@app.route('/api/projects/<project_id>/messages', methods=['GET'])
+@api.route('/api/projects/<project_id>/messages', methods=['GET'])
 @jwt_required()
 def get_project_messages(project_id):
     try:
-        response = supabase.table('messages').select('*').eq('project_id', project_id).order('created_at', desc=True).execute()
-        
-        if not response.data:
-            return jsonify([])
-            
-        return jsonify(response.data)
+        return list_response(listings.PROJECT_MESSAGES, project_id, namespace="project_messages")
     except Exception as e:
         print(f"Error in get_project_messages: {str(e)}")
         return jsonify({"error": "Error interno del servidor"}), 500
 
 
 
-@app.route('/api/projects/<project_id>', methods=['GET'])
+@api.route('/api/projects/<project_id>', methods=['GET'])
 @jwt_required()
 def get_project_details(project_id):
     current_user = get_jwt_identity()
 
     print(current_user['role'])
     try:
-        if current_user['role'] == 'client':
-            # Clients can only see their own projects
-            response = supabase.table('projects').select('*').eq('id', project_id).eq('user_id', current_user['id']).execute()
-        else:
-            # Providers can see all projects
-            response = supabase.table('projects').select('*').eq('id', project_id).execute()
-        
-        if not response.data:
-            return jsonify({"error": "Proyecto no encontrado"}), 404
-            
-        return jsonify(response.data[0])
+        def load():
+            if current_user['role'] == 'client':
+                # Clients can only see their own projects
+                response = supabase.table('projects').select('*').eq('id', project_id).eq('user_id', current_user['id']).execute()
+            else:
+                # Providers can see all projects
+                response = supabase.table('projects').select('*').eq('id', project_id).execute()
+
+            if not response.data:
+                return {"error": "Proyecto no encontrado"}, 404
+            return response.data[0], 200
+
+        return cached_json("project", scope_key(listings.client_scope(current_user)), load, key=project_id)
     except Exception as e:
         print(f"Error in get_project_details: {str(e)}")
         return jsonify({"error": "Error interno del servidor"}), 500
     
-@app.route('/api/projects/<string:project_id>/status', methods=['PUT'])
+# Proyecto, documentos, actualizaciones y mensajes recientes en una sola respuesta
+@api.route('/api/projects/<string:project_id>/bundle', methods=['GET'])
+@jwt_required()
+def get_project_bundle(project_id):
+    if not is_valid_uuid(project_id):
+        return jsonify({"error": "ID de proyecto inválido"}), 400
+
+    try:
+        limit = min(int(request.args.get('limit', listings.BUNDLE_PAGE_SIZE)), listings.MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError()
+    except ValueError:
+        return jsonify({"error": "limit inválido"}), 400
+
+    try:
+        user_id = listings.client_scope(get_jwt_identity())
+
+        def project_query(db):
+            # Clients can only see their own projects
+            query = db.table('projects').select('*').eq('id', project_id)
+            if user_id is not None:
+                query = query.eq('user_id', user_id)
+            return query.execute()
+
+        def load():
+            project, documents, updates, messages = fanout.gather(
+                project_query,
+                lambda db: db.table('contracts').select('*').eq('project_id', project_id).execute(),
+                lambda db: listings.PROJECT_UPDATES.page_query(db, project_id, limit).execute(),
+                lambda db: listings.PROJECT_MESSAGES.page_query(db, project_id, limit).execute()
+            )
+
+            if not project.data:
+                return {"error": "Proyecto no encontrado"}, 404
+
+            updates_page, updates_cursor = listings.PROJECT_UPDATES.page_result(updates.data, limit)
+            messages_page, messages_cursor = listings.PROJECT_MESSAGES.page_result(messages.data, limit)
+
+            # Los cursores sirven para seguir paginando en /updates y /messages
+            return {
+                "project": project.data[0],
+                "documents": documents.data,
+                "updates": {"data": updates_page, "next_cursor": updates_cursor},
+                "messages": {"data": messages_page, "next_cursor": messages_cursor}
+            }, 200
+
+        return cached_json("project_bundle", project_id, load, key=(scope_key(user_id), limit))
+    except Exception as e:
+        print(f"Error in get_project_bundle: {str(e)}")
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+# Cambios desde un token de sincronización: proyectos, mensajes, actualizaciones y contratos
+@api.route('/api/sync', methods=['GET'])
+@jwt_required()
+def sync_changes():
+    if not change_log.enabled:
+        return jsonify({"error": "Sincronización no habilitada"}), 404
+
+    try:
+        current_user = get_jwt_identity()
+        since = request.args.get('since')
+
+        # Sin token: solo el token de partida, antes de cargar las listas completas
+        if since is None:
+            return jsonify({"next": str(change_log.current_token())}), 200
+
+        try:
+            since = int(since)
+            if since < 0:
+                raise ValueError
+        except ValueError:
+            return jsonify({"error": "Token de sincronización inválido"}), 400
+
+        if change_log.expired(since):
+            return jsonify({"error": "Token de sincronización vencido", "reset": True}), 410
+
+        upserts, deletes, next_token, has_more = change_log.read(since, listings.client_scope(current_user))
+
+        entities = list(upserts)
+        responses = fanout.gather(*(
+            lambda db, entity=entity: db.table(ChangeLog.ENTITIES[entity]).select('*').in_('id', upserts[entity]).execute()
+            for entity in entities
+        )) if entities else []
+
+        result = {table: [] for table in ChangeLog.ENTITIES.values()}
+        deleted = {table: list(deletes.get(entity, [])) for entity, table in ChangeLog.ENTITIES.items()}
+        for entity, response in zip(entities, responses):
+            table = ChangeLog.ENTITIES[entity]
+            result[table] = response.data
+            # Filas borradas después de su última escritura (p. ej. con su proyecto)
+            found = {str(row['id']) for row in response.data}
+            deleted[table].extend(entity_id for entity_id in upserts[entity] if entity_id not in found)
+
+        result["deleted"] = deleted
+        result["next"] = str(next_token)
+        result["has_more"] = has_more
+        return jsonify(result), 200
+
+    except Exception as e:
+        print(f"Error in sync_changes: {str(e)}")
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+@api.route('/api/projects/<string:project_id>/status', methods=['PUT'])
 @jwt_required()
 def update_project_status(project_id):
     try:
@@ -524,12 +1226,17 @@ def update_project_status(project_id):
         response = supabase.table('projects').update({
             'status': new_status
         }).eq('id', project_id).execute()
-        
+
+        for project in response.data:
+            invalidate_project_reads(project['user_id'], project_id)
+            publish_project_status(project)
+        change_log.append([ChangeLog.entry("project", project, project['user_id']) for project in response.data])
+
         return jsonify({"message": "Status updated successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
-@app.route('/api/projects/<string:project_id>/updates', methods=['GET', 'POST'])
+@api.route('/api/projects/<string:project_id>/updates', methods=['GET', 'POST'])
 @jwt_required()
 def project_updates(project_id):
     try:
@@ -559,7 +1266,7 @@ def project_updates(project_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/projects/<string:project_id>/documents', methods=['GET'])
+@api.route('/api/projects/<string:project_id>/documents', methods=['GET'])
 @jwt_required()
 def get_project_documents(project_id):
     if not is_valid_uuid(project_id):
@@ -567,17 +1274,19 @@ def get_project_documents(project_id):
 
     try:
         current_user = get_jwt_identity()
-        
-        # Get project details to verify ownership
-        project_response = supabase.table('projects').select('*').eq('id', project_id).execute()
-        
-        if not project_response.data:
-            return jsonify({"error": "Proyecto no encontrado"}), 404
 
-        # Get contract documents
-        contract_response = supabase.table('contracts').select('*').eq('project_id', project_id).execute()
-        
-        return jsonify(contract_response.data), 200
+        def load():
+            # Project lookup and contract documents are independent, fetch them concurrently
+            project_response, contract_response = fanout.gather(
+                lambda db: db.table('projects').select('id').eq('id', project_id).execute(),
+                lambda db: db.table('contracts').select('*').eq('project_id', project_id).execute()
+            )
+
+            if not project_response.data:
+                return {"error": "Proyecto no encontrado"}, 404
+            return contract_response.data, 200
+
+        return cached_json("project_documents", project_id, load)
 
     except Exception as e:
         print(f"Error getting project documents: {str(e)}")
@@ -585,7 +1294,7 @@ def get_project_documents(project_id):
 
 
     
-@app.route("/api/add-project", methods=["POST"])
+@api.route("/api/add-project", methods=["POST"])
 @jwt_required()
 def add_project():
     try:
@@ -617,6 +1326,9 @@ def add_project():
         if not response.data:
             return jsonify({"error": response.error.message}), 400
 
+        invalidate_project_reads(user_id)
+        change_log.append([ChangeLog.entry("project", response.data[0], user_id)])
+
         # Devuelve el primer elemento de los datos insertados
         return jsonify({"message": "Proyecto creado exitosamente", "project": response.data[0]}), 201
     except Exception as e:
@@ -624,7 +1336,7 @@ def add_project():
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/api/cancel-project/<string:project_id>", methods=["DELETE"])
+@api.route("/api/cancel-project/<string:project_id>", methods=["DELETE"])
 @jwt_required()
 def cancel_project(project_id):
     try:
@@ -635,8 +1347,6 @@ def cancel_project(project_id):
         user_id = jwt_identity["id"] if isinstance(jwt_identity, dict) else jwt_identity
 
         # Verifica si el proyecto pertenece al usuario y no tiene contrato ni comprobante de pago
-        print(response.data)
-        
         response = supabase.table("projects").select("contract_url, payment_proof_url, user_id").eq("id", project_id).execute()
 
 
@@ -658,13 +1368,21 @@ def cancel_project(project_id):
         if not delete_response.data:
             return jsonify({"error": "No se pudo cancelar el proyecto"}), 400
 
+        invalidate_project_reads(user_id, project_id)
+        invalidate_project_content(project_id, *PROJECT_NAMESPACES)
+        for namespace in MESSAGE_OWNER_NAMESPACES:
+            read_cache.invalidate_owner(namespace, user_id)
+        read_cache.invalidate("project_owner", project_id)
+        # Lápida: /api/sync informa la baja aunque la fila ya no exista
+        change_log.append([ChangeLog.entry("project", {"id": project_id}, user_id, ChangeLog.DELETE)])
+
         return jsonify({"message": "Proyecto cancelado exitosamente"}), 200
     except Exception as e:
         print("Error:", e)
         return jsonify({"error": str(e)}), 500
     
 
-@app.route('/api/request-password-reset', methods=['POST'])
+@api.route('/api/request-password-reset', methods=['POST'])
 def request_password_reset():
     data = request.json
     email = data.get('email')
@@ -702,7 +1420,7 @@ def request_password_reset():
         print("Error in request_password_reset:", str(e))
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/verify-reset-token', methods=['POST'])
+@api.route('/api/verify-reset-token', methods=['POST'])
 def verify_reset_token():
     data = request.json
     token = data.get('token')
@@ -730,7 +1448,7 @@ def verify_reset_token():
         print("Error in verify_reset_token:", str(e))
         return jsonify({"error": str(e)}), 500
     
-@app.route('/api/reset-password', methods=['POST'])
+@api.route('/api/reset-password', methods=['POST'])
 def reset_password():
     data = request.json
     token = data.get('token')
@@ -754,20 +1472,25 @@ def reset_password():
             return jsonify({"error": "Token expirado"}), 400
 
         # Update password
-        hashed_password = bcrypt.generate_password_hash(new_password).decode('utf-8')
+        hashed_password = password_hasher.generate_password_hash(new_password)
         supabase.table('users').update({"password": hashed_password}).eq('id', reset_data['user_id']).execute()
         
         # Mark token as used
         supabase.table('password_resets').update({"used": True}).eq('token', token).execute()
+
+        # Invalidate every token issued with the old password
+        token_generations.bump(reset_data['user_id'])
         
         return jsonify({"message": "Contraseña actualizada exitosamente"})
 
+    except HashingBusy:
+        raise
     except Exception as e:
         print("Error in reset_password:", str(e))
         return jsonify({"error": str(e)}), 500
 
 # Ruta de verificación de token
-@app.route('/api/verify-token', methods=['POST'])
+@api.route('/api/verify-token', methods=['POST'])
 @jwt_required()
 def verify_token():
     current_user = get_jwt_identity()
@@ -783,11 +1506,34 @@ def verify_token():
 def check_if_token_in_blocklist(jwt_header, jwt_payload):
     jti = jwt_payload["jti"]
     try:
-        # Verificar si el jti está en la lista negra
-        response = supabase.table("token_blacklist").select("*").eq("jti", jti).execute()
-        return len(response.data) > 0
+        # Tokens emitidos antes de un "cerrar sesión en todos lados" o un cambio de contraseña
+        if token_generations.is_stale(jwt_payload["sub"], jwt_payload.get("gen")):
+            return True
+        # Verificar contra la copia local de la lista negra (sincronizada con Supabase)
+        return revocation_cache.is_revoked(jti)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        print(f"Error in check_if_token_in_blocklist: {str(e)}")
+        return True
+
+# /api/events se sirve fuera de Flask (events.py): el token se valida igual que en jwt_required
+@event_stream.authenticator
+def authenticate_event_stream(token):
+    claims = decode_token(token)
+    if claims.get("type") != "access" or check_if_token_in_blocklist(None, claims):
+        raise PermissionError("Token revocado")
+    return listings.client_scope(claims["identity"])
+
+# Antes de la vista: los except Exception de las rutas convertirían el 413 en 500
+@api.before_request
+def limit_request_body():
+    if not apply_body_limit():
+        return jsonify({"error": "El cuerpo de la solicitud supera el tamaño máximo permitido"}), 413
+
+@api.app_errorhandler(HashingBusy)
+def hashing_busy_callback(error):
+    response = jsonify({"error": "Servidor ocupado, intenta de nuevo en unos segundos"})
+    response.headers["Retry-After"] = "1"
+    return response, 503
 
 @jwt.unauthorized_loader
 def unauthorized_callback(callback):
@@ -797,5 +1543,89 @@ def unauthorized_callback(callback):
 def invalid_token_callback(callback):
     return jsonify({"error": "Token inválido"}), 422
 
+def create_app(config=None):
+    # config: valores que reemplazan a los de entorno (p. ej. BCRYPT_LOG_ROUNDS bajo en pruebas)
+    app = Flask(__name__)
+    app.request_class = SpoolingRequest
+    CORS(app, supports_credentials=True ,resources={r"/api/*": {"origins": ["http://localhost:5173"]}})
+    app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
+    app.config["JWT_ACCESS_TOKEN_EXPIRES"] = datetime.timedelta(hours=1)
+    app.config["JWT_REFRESH_TOKEN_EXPIRES"] = datetime.timedelta(days=int(os.getenv("JWT_REFRESH_TOKEN_DAYS", "30")))
+    app.config["JWT_IDENTITY_CLAIM"] = "identity"
+    app.config["JWT_TOKEN_LOCATION"] = ["headers"]
+    app.config["JWT_HEADER_NAME"] = "Authorization"
+    app.config["JWT_HEADER_TYPE"] = "Bearer"
+    app.config["REVOCATION_STALENESS_SECONDS"] = int(os.getenv("REVOCATION_STALENESS_SECONDS", "30"))
+    app.config["REVOCATION_SYNC_RETRY_SECONDS"] = int(os.getenv("REVOCATION_SYNC_RETRY_SECONDS", "5"))
+    if os.getenv("BCRYPT_LOG_ROUNDS"):
+        app.config["BCRYPT_LOG_ROUNDS"] = int(os.getenv("BCRYPT_LOG_ROUNDS"))
+    app.config["BCRYPT_TARGET_MS"] = int(os.getenv("BCRYPT_TARGET_MS", "250"))
+    app.config["BCRYPT_CALIBRATION_SAMPLES"] = int(os.getenv("BCRYPT_CALIBRATION_SAMPLES", "5"))
+    # Sin variable de entorno, hashing.py define los valores por defecto (cola: 4 por hilo)
+    if os.getenv("PASSWORD_HASH_WORKERS"):
+        app.config["PASSWORD_HASH_WORKERS"] = int(os.getenv("PASSWORD_HASH_WORKERS"))
+    if os.getenv("PASSWORD_HASH_MAX_PENDING"):
+        app.config["PASSWORD_HASH_MAX_PENDING"] = int(os.getenv("PASSWORD_HASH_MAX_PENDING"))
+    app.config["JWT_DECODE_CACHE_MAX_ENTRIES"] = int(os.getenv("JWT_DECODE_CACHE_MAX_ENTRIES", "4096"))
+    app.config["MAINTENANCE_INTERVAL_SECONDS"] = int(os.getenv("MAINTENANCE_INTERVAL_SECONDS", "3600"))
+    app.config["CHANGE_FEED_ENABLED"] = os.getenv("CHANGE_FEED_ENABLED", "false").lower() in ("1", "true", "yes")
+    app.config["EVENTS_ENABLED"] = os.getenv("EVENTS_ENABLED", "false").lower() in ("1", "true", "yes")
+    app.config["EVENTS_HOST"] = os.getenv("EVENTS_HOST", "127.0.0.1")
+    app.config["EVENTS_PORT"] = int(os.getenv("EVENTS_PORT", "5001"))
+    app.config["EVENTS_BUFFER_SIZE"] = int(os.getenv("EVENTS_BUFFER_SIZE", "256"))
+    app.config["EVENTS_HISTORY_SIZE"] = int(os.getenv("EVENTS_HISTORY_SIZE", "1000"))
+    app.config["CHANGE_LOG_ENABLED"] = os.getenv("CHANGE_LOG_ENABLED", "false").lower() in ("1", "true", "yes")
+    app.config["CHANGE_LOG_RETENTION_DAYS"] = int(os.getenv("CHANGE_LOG_RETENTION_DAYS", "30"))
+    app.config["STORAGE_FILE_SIZE_LIMIT"] = int(os.getenv("STORAGE_FILE_SIZE_LIMIT", str(50 * 1024 * 1024)))
+    if os.getenv("STORAGE_ALLOWED_MIME_TYPES"):
+        app.config["STORAGE_ALLOWED_MIME_TYPES"] = os.getenv("STORAGE_ALLOWED_MIME_TYPES").split(",")
+    app.config["STORAGE_ENFORCE_BUCKET_OPTIONS"] = os.getenv("STORAGE_ENFORCE_BUCKET_OPTIONS", "false").lower() in ("1", "true", "yes")
+    # Las partes de un multipart pasan a disco desde este tamaño; el cuerpo completo tiene tope
+    app.config["UPLOAD_SPOOL_THRESHOLD"] = int(os.getenv("UPLOAD_SPOOL_THRESHOLD", str(512 * 1024)))
+    app.config["UPLOAD_WORKERS"] = int(os.getenv("UPLOAD_WORKERS", "4"))
+    app.config["UPLOAD_WORKERS_PER_REQUEST"] = int(os.getenv(
+        "UPLOAD_WORKERS_PER_REQUEST", str(max(1, app.config["UPLOAD_WORKERS"] // 2))
+    ))
+    app.config["UPLOAD_TIMEOUT_SECONDS"] = int(os.getenv("UPLOAD_TIMEOUT_SECONDS", "120"))
+    app.config["UPLOAD_MAX_FILES"] = int(os.getenv("UPLOAD_MAX_FILES", "10"))
+    app.config["UPLOAD_SESSION_MAX_AGE_SECONDS"] = int(os.getenv("UPLOAD_SESSION_MAX_AGE_SECONDS", "7200"))
+    if os.getenv("UPLOAD_STAGING_DIR"):
+        app.config["UPLOAD_STAGING_DIR"] = os.getenv("UPLOAD_STAGING_DIR")
+    app.config["UPLOAD_STAGING_TTL_SECONDS"] = int(os.getenv("UPLOAD_STAGING_TTL_SECONDS", "86400"))
+    app.config["UPLOAD_CHUNK_MAX_BYTES"] = int(os.getenv("UPLOAD_CHUNK_MAX_BYTES", str(8 * 1024 * 1024)))
+    # Cuerpos JSON; las rutas de subida lo amplían con upload_body
+    app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("MAX_CONTENT_LENGTH", str(1024 * 1024)))
+    app.config["UPLOAD_MAX_CONTENT_LENGTH"] = int(os.getenv(
+        "UPLOAD_MAX_CONTENT_LENGTH",
+        str(app.config["UPLOAD_MAX_FILES"] * app.config["STORAGE_FILE_SIZE_LIMIT"] + 1024 * 1024)
+    ))
+    if config:
+        app.config.update(config)
+
+    # Primero: calibra BCRYPT_LOG_ROUNDS, que Flask-Bcrypt lee en su init_app
+    password_hasher.init_app(app)
+    bcrypt.init_app(app)
+    jwt.init_app(app)
+    revocation_cache.init_app(app)
+    token_generations.init_app(app)
+    maintenance.init_app(app)
+    fanout.init_app(app)
+    change_feed.init_app(app)
+    event_stream.init_app(app)
+    change_log.init_app(app)
+    storage_buckets.init_app(app)
+    document_uploader.init_app(app)
+    signed_uploads.init_app(app)
+    resumable_uploads.init_app(app)
+    app.register_blueprint(api)
+    return app
+
 if __name__ == '__main__':
+    # Servidor de desarrollo; en producción se usa gunicorn (ver wsgi.py y gunicorn.conf.py)
+    from transport import prewarm
+    app = create_app()
+    prewarm(supabase, Config.transport_settings())
+    storage_buckets.provision()
+    if event_stream.enabled:
+        event_stream.ensure_started()
     app.run(host='127.0.0.1', port=5000)
@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Mide el pico de memoria (RSS) de subir un documento por la ruta anterior (read() y bytes)
+# y por la ruta en streaming (uploads.upload_source), contra un Storage local que descarta los datos
+MODES = ("buffered", "streaming")
+
+
+class DiscardingStorage(BaseHTTPRequestHandler):
+    # Stand-in for the storage API: reads the body in chunks and throws it away
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        if "chunked" in self.headers.get("Transfer-Encoding", ""):
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                self.rfile.read(size + 2)
+                if size == 0:
+                    break
+        else:
+            remaining = int(self.headers.get("Content-Length") or 0)
+            while remaining:
+                remaining -= len(self.rfile.read(min(remaining, 1024 * 1024)))
+        body = json.dumps({"Key": self.path}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def peak_rss_mb():
+    # ru_maxrss está en KB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_file(size_mb):
+    handle = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+    chunk = os.urandom(1024 * 1024)
+    for _ in range(size_mb):
+        handle.write(chunk)
+    handle.close()
+    return handle.name
+
+
+def run_case(mode, size_mb, port, spool_threshold):
+    # Runs in its own process so ru_maxrss only reflects this upload
+    from flask import Flask, request
+    from storage3 import SyncStorageClient
+    from uploads import SpoolingRequest, upload_source
+
+    app = Flask("bench_upload")
+    app.request_class = SpoolingRequest
+    app.config["UPLOAD_SPOOL_THRESHOLD"] = spool_threshold
+    storage = SyncStorageClient(f"http://127.0.0.1:{port}/storage/v1", {"apiKey": "bench", "Authorization": "Bearer bench"})
+    bucket = storage.from_("project-documents")
+
+    def upload(path):
+        with open(path, "rb") as source:
+            with app.test_request_context("/upload", method="POST", data={"contract": (source, "contract.pdf")}):
+                contract = request.files["contract"]
+                options = {"content-type": "application/pdf"}
+                if mode == "buffered":
+                    bucket.upload(path="bench/contract.pdf", file=contract.read(), file_options=options)
+                else:
+                    with upload_source(contract) as data:
+                        bucket.upload(path="bench/contract.pdf", file=data, file_options=options)
+
+    # Warm-up: imports, connection pool and parser buffers are not part of the measurement
+    warmup = make_file(1)
+    big = make_file(size_mb)
+    try:
+        upload(warmup)
+        before = peak_rss_mb()
+        start = time.perf_counter()
+        upload(big)
+        elapsed = time.perf_counter() - start
+        return {"mode": mode, "size_mb": size_mb, "peak_increase_mb": round(peak_rss_mb() - before, 1),
+                "seconds": round(elapsed, 2)}
+    finally:
+        os.unlink(warmup)
+        os.unlink(big)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak memory of a document upload, buffered vs streaming")
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[5, 20, 50])
+    parser.add_argument("--spool-threshold", type=int, default=512 * 1024)
+    parser.add_argument("--max-streaming-mb", type=float, default=None,
+                        help="fail if a streaming upload raises peak RSS by more than this")
+    parser.add_argument("--case", nargs=3, metavar=("MODE", "SIZE_MB", "PORT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        mode, size_mb, port = args.case
+        print(json.dumps(run_case(mode, int(size_mb), int(port), args.spool_threshold)))
+        return 0
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DiscardingStorage)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    failed = False
+    print(f"{'size':>8}  {'mode':<10} {'peak RSS increase':>18}  {'time':>7}")
+    try:
+        for size_mb in args.sizes_mb:
+            for mode in MODES:
+                result = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--spool-threshold", str(args.spool_threshold),
+                     "--case", mode, str(size_mb), str(port)],
+                    capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+                )
+                if result.returncode != 0:
+                    raise RuntimeError(f"{mode} {size_mb}MB failed:\n{result.stderr[-2000:]}")
+                case = json.loads(result.stdout.strip().splitlines()[-1])
+                print(f"{size_mb:>6}MB  {mode:<10} {case['peak_increase_mb']:>15.1f} MB  {case['seconds']:>6.2f}s")
+                if (mode == "streaming" and args.max_streaming_mb is not None
+                        and case["peak_increase_mb"] > args.max_streaming_mb):
+                    print(f"  FAIL: streaming upload over {args.max_streaming_mb} MB")
+                    failed = True
+    finally:
+        server.shutdown()
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+PROVIDER_SCOPE = "provider"
+
+_COUNTERS = ("hits", "misses", "stores", "discarded", "invalidations", "invalidated_entries", "evictions")
+
+
+def scope_key(user_id=None):
+    # Cache entries are per client, while every provider shares one view
+    return str(user_id) if user_id is not None else PROVIDER_SCOPE
+
+
+class ScopedCache:
+    """
+    In-process read-through cache keyed by (namespace, scope, key).
+
+    Entries expire after ``ttl`` seconds but are normally dropped earlier by
+    the write handlers through ``invalidate``. A load that raced with an
+    invalidation is not stored, so a stale value cannot outlive the write
+    that made it stale. Hits, misses and invalidations are counted per
+    namespace and reported by ``stats``.
+    """
+
+    def __init__(self, ttl=60, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (namespace, scope, key) -> (value, expires_at)
+        self._versions = {}  # (namespace, scope) -> int
+        self._namespace_versions = {}  # namespace -> int
+        self._epoch = 0
+        self._counters = defaultdict(lambda: dict.fromkeys(_COUNTERS, 0))
+        self._lock = threading.Lock()
+
+    def _version(self, namespace, scope):
+        return self._epoch, self._namespace_versions.get(namespace, 0), self._versions.get((namespace, scope), 0)
+
+    def get_or_load(self, namespace, scope, loader, key=None, cacheable=None):
+        entry_key = (namespace, scope, key)
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(entry_key)
+                self._counters[namespace]["hits"] += 1
+                return entry[0]
+            self._counters[namespace]["misses"] += 1
+            version = self._version(namespace, scope)
+
+        value = loader()
+        if cacheable is not None and not cacheable(value):
+            return value
+
+        with self._lock:
+            if self._version(namespace, scope) != version:
+                self._counters[namespace]["discarded"] += 1
+                return value
+            self._entries[entry_key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(entry_key)
+            self._counters[namespace]["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                evicted = self._entries.popitem(last=False)
+                self._counters[evicted[0][0]]["evictions"] += 1
+        return value
+
+    def invalidate(self, namespace, *scopes):
+        with self._lock:
+            for scope in scopes:
+                self._versions[(namespace, scope)] = self._versions.get((namespace, scope), 0) + 1
+            self._drop(namespace, lambda entry_key: entry_key[1] in scopes)
+
+    def invalidate_owner(self, namespace, user_id):
+        # A change to a client's rows is visible to that client and to providers
+        self.invalidate(namespace, scope_key(user_id), PROVIDER_SCOPE)
+
+    def invalidate_namespace(self, namespace):
+        # For writes that touch every scope at once (e.g. a broadcast)
+        with self._lock:
+            self._namespace_versions[namespace] = self._namespace_versions.get(namespace, 0) + 1
+            self._drop(namespace, lambda entry_key: True)
+
+    def _drop(self, namespace, matches):
+        stale = [k for k in self._entries if k[0] == namespace and matches(k)]
+        for entry_key in stale:
+            del self._entries[entry_key]
+        self._counters[namespace]["invalidations"] += 1
+        self._counters[namespace]["invalidated_entries"] += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            entries = defaultdict(int)
+            for namespace, _, _ in self._entries:
+                entries[namespace] += 1
+            namespaces = {}
+            for namespace, counters in self._counters.items():
+                lookups = counters["hits"] + counters["misses"]
+                namespaces[namespace] = dict(
+                    counters,
+                    entries=entries[namespace],
+                    hit_ratio=round(counters["hits"] / lookups, 3) if lookups else None
+                )
+            return {"entries": len(self._entries), "max_entries": self.max_entries, "ttl": self.ttl,
+                    "namespaces": namespaces}
@@ -0,0 +1,258 @@
+import asyncio
+import datetime
+import functools
+import os
+import threading
+
+
+class UnsupportedRealtime(RuntimeError):
+    pass
+
+
+class RealtimeConnection:
+    """
+    The parts of realtime's AsyncRealtimeClient the change feed drives itself.
+
+    realtime reconnects without re-sending the postgres_changes config, so the
+    feed runs the client's private receive and heartbeat loops (``_listen``,
+    ``_heartbeat``) and reconnects from scratch. Those are only known to work
+    this way in the versions of ``SUPPORTED_VERSIONS``; another version is
+    refused on connect instead of failing in some other way.
+    """
+
+    SUPPORTED_VERSIONS = ("2.0.",)
+
+    def __init__(self, url, key, heartbeat):
+        from realtime import AsyncRealtimeClient
+
+        self.check_version(AsyncRealtimeClient)
+        self.socket = AsyncRealtimeClient(url, key, auto_reconnect=False, hb_interval=heartbeat, max_retries=1)
+        self._tasks = ()
+
+    @classmethod
+    def check_version(cls, client_class):
+        from importlib import metadata
+
+        try:
+            installed = metadata.version("realtime")
+        except metadata.PackageNotFoundError:
+            installed = "unknown"
+        missing = [name for name in ("_listen", "_heartbeat") if not hasattr(client_class, name)]
+        if not installed.startswith(cls.SUPPORTED_VERSIONS) or missing:
+            raise UnsupportedRealtime(
+                f"realtime {installed} is not supported by the change feed (expected {', '.join(cls.SUPPORTED_VERSIONS)}x)"
+            )
+
+    async def connect(self):
+        await self.socket.connect()
+
+    def channel(self, name):
+        return self.socket.channel(name)
+
+    def start(self):
+        # Returns the receive loop, which ends when the connection closes
+        listener = asyncio.ensure_future(self.socket._listen())
+        self._tasks = (listener, asyncio.ensure_future(self.socket._heartbeat()))
+        return listener
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        try:
+            await self.socket.ws_connection.close()
+        except Exception:
+            pass
+
+
+class ChangeFeed:
+    """
+    Listens to Supabase realtime Postgres changes and hands them to handlers.
+
+    Each process keeps one websocket in a daemon thread, started on the first
+    request so it is fork-safe, subscribed to every table that has a handler
+    (see ``handler``). Handlers receive ``(event, record, old_record)`` with
+    event INSERT, UPDATE or DELETE.
+
+    When the connection drops the feed reconnects with backoff and, once
+    subscribed again, replays what it may have missed. Rows of tables
+    registered with a ``resync_column`` newer than the disconnect are passed
+    to their handler as INSERTs. Handlers of the other tables, or of every
+    table when the gap is longer than ``max_replay``, are called once with
+    event RESYNC and no record, so they can drop whatever they derive from
+    that table.
+    """
+
+    RESYNC = "RESYNC"
+
+    def __init__(self, client, app=None):
+        self.client = client
+        self.enabled = False
+        self.url = None
+        self.key = None
+        self.heartbeat = 25
+        self.subscribe_timeout = 10
+        self.max_backoff = 60
+        self.max_replay = datetime.timedelta(hours=1)
+        # A dead socket is noticed within websockets' ping timeout; replay from well before that
+        self.resync_margin = datetime.timedelta(seconds=60)
+        self.page_size = 1000
+        self.state = "stopped"
+        self.last_event_at = None
+        self.counters = {"events": 0, "handler_errors": 0, "connects": 0, "disconnects": 0,
+                         "replayed_rows": 0, "resyncs": 0}
+        self._handlers = {}  # table -> (handler, resync_column)
+        self._resync_from = None
+        self._backoff = 1
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.url = app.config.setdefault("CHANGE_FEED_URL", self.client.realtime_url)
+        self.key = app.config.setdefault("CHANGE_FEED_KEY", self.client.supabase_key)
+        self.heartbeat = app.config.setdefault("CHANGE_FEED_HEARTBEAT_SECONDS", 25)
+        self.max_backoff = app.config.setdefault("CHANGE_FEED_MAX_BACKOFF_SECONDS", 60)
+        self.max_replay = datetime.timedelta(seconds=app.config.setdefault("CHANGE_FEED_MAX_REPLAY_SECONDS", 3600))
+        self.enabled = app.config.setdefault("CHANGE_FEED_ENABLED", False)
+        if self.enabled:
+            app.before_request(self.ensure_started)
+        app.extensions["change_feed"] = self
+
+    def handler(self, table, resync_column=None):
+        def decorator(callback):
+            self._handlers[table] = (callback, resync_column)
+            return callback
+        return decorator
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stop.clear()
+            # Cached reads may predate the subscription: the first replay covers them
+            self._resync_from = datetime.datetime.utcnow() - self.resync_margin
+            threading.Thread(target=self._run, name="change-feed", daemon=True).start()
+            self._pid = os.getpid()
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self):
+        return {
+            "state": self.state,
+            "tables": sorted(self._handlers),
+            "last_event_at": self.last_event_at.isoformat() if self.last_event_at else None,
+            **self.counters,
+        }
+
+    def _run(self):
+        asyncio.run(self._main())
+
+    async def _main(self):
+        while not self._stop.is_set():
+            try:
+                await self._listen_once()
+            except UnsupportedRealtime as e:
+                self.state = "unsupported"
+                print(f"Change feed disabled: {str(e)}")
+                return
+            except Exception as e:
+                print(f"Error in change feed: {str(e)}")
+            self.state = "disconnected"
+            await asyncio.sleep(self._backoff)
+            self._backoff = min(self._backoff * 2, self.max_backoff)
+
+    async def _listen_once(self):
+        from realtime import RealtimeSubscribeStates
+
+        self.state = "connecting"
+        socket = RealtimeConnection(self.url, self.key, self.heartbeat)
+        await socket.connect()
+        self.counters["connects"] += 1
+
+        channel = socket.channel("server-change-feed")
+        for table in self._handlers:
+            channel.on_postgres_changes("*", table=table, callback=functools.partial(self._on_change, table))
+
+        subscribed = asyncio.get_running_loop().create_future()
+
+        def on_subscribe(state, error):
+            if subscribed.done():
+                return
+            if state == RealtimeSubscribeStates.SUBSCRIBED:
+                subscribed.set_result(True)
+            else:
+                subscribed.set_exception(error or RuntimeError(f"Change feed subscription {state}"))
+
+        await channel.subscribe(on_subscribe)
+        listener = socket.start()
+        try:
+            await asyncio.wait({subscribed, listener}, timeout=self.subscribe_timeout,
+                               return_when=asyncio.FIRST_COMPLETED)
+            if not subscribed.done():
+                raise RuntimeError("Change feed subscription timed out")
+            subscribed.result()
+
+            self.state = "subscribed"
+            self._backoff = 1
+            await asyncio.get_running_loop().run_in_executor(None, self._resync)
+            await listener
+        finally:
+            if self.state == "subscribed":
+                self.counters["disconnects"] += 1
+                self._resync_from = datetime.datetime.utcnow() - self.resync_margin
+            await socket.close()
+
+    def _on_change(self, table, payload):
+        data = payload.get("data", payload)
+        # realtime calls every "*" binding for every change, whatever its table
+        if data.get("table") != table:
+            return
+        self.counters["events"] += 1
+        commit = data.get("commit_timestamp")
+        if commit:
+            try:
+                self.last_event_at = datetime.datetime.fromisoformat(commit.replace("Z", "+00:00"))
+            except ValueError:
+                pass
+        self._dispatch(table, data.get("type"), data.get("record") or None, data.get("old_record") or None)
+
+    def _dispatch(self, table, event, record, old_record):
+        entry = self._handlers.get(table)
+        if entry is None:
+            return
+        try:
+            entry[0](event, record, old_record)
+        except Exception as e:
+            self.counters["handler_errors"] += 1
+            print(f"Error handling {event} on {table}: {str(e)}")
+
+    def _resync(self):
+        since = self._resync_from
+        self.counters["resyncs"] += 1
+        replay = since is not None and datetime.datetime.utcnow() - since <= self.max_replay
+        for table, (callback, column) in self._handlers.items():
+            if column is None or not replay:
+                self._dispatch(table, self.RESYNC, None, None)
+                continue
+            try:
+                for row in self._fetch_since(table, column, since):
+                    self.counters["replayed_rows"] += 1
+                    self._dispatch(table, "INSERT", row, None)
+            except Exception as e:
+                print(f"Error replaying {table}: {str(e)}")
+                self._dispatch(table, self.RESYNC, None, None)
+
+    def _fetch_since(self, table, column, since):
+        offset = 0
+        while True:
+            page = self.client.table(table).select("*").gte(column, since.isoformat()) \
+                .order(column).range(offset, offset + self.page_size - 1).execute()
+            yield from page.data
+            if len(page.data) < self.page_size:
+                return
+            offset += self.page_size
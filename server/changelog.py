@@ -0,0 +1,112 @@
+class ChangeLog:
+    """
+    Append-only log of writes, read by ``/api/sync``.
+
+    Write handlers append one entry per changed row with the owner of its
+    project, so a client reads only its own entries and a provider all of
+    them. The bigserial id of an entry is the sync token.
+
+    Ids are taken at insert time but become visible at commit, so an entry
+    may show up after one with a higher id. ``read`` therefore only moves the
+    token past entries older than ``settle`` seconds; newer entries are
+    returned but sent again on the next call, and applying a change twice is
+    harmless. Both ``created_at`` and the age of an entry come from the
+    database clock (the column default and the ``change_log_entries`` view),
+    so the clocks of the app hosts play no part.
+    """
+
+    TABLE = "change_log"
+    # Vista con age_seconds: la edad de cada entrada según el reloj de la base
+    VIEW = "change_log_entries"
+    # Entidad -> tabla de la que se leen las filas actuales
+    ENTITIES = {
+        "project": "projects",
+        "message": "messages",
+        "progress_update": "progress_updates",
+        "contract": "contracts",
+        "project_document": "project_documents",
+    }
+    UPSERT = "upsert"
+    DELETE = "delete"
+
+    def __init__(self, client, app=None):
+        self.client = client
+        self.enabled = False
+        self.page_size = 500
+        self.settle = 5
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.setdefault("CHANGE_LOG_ENABLED", False)
+        self.page_size = app.config.setdefault("SYNC_PAGE_SIZE", 500)
+        self.settle = app.config.setdefault("SYNC_SETTLE_SECONDS", 5)
+        app.extensions["change_log"] = self
+
+    @staticmethod
+    def entry(entity, row, owner_id, op=UPSERT):
+        return {
+            "entity": entity,
+            "entity_id": str(row["id"]),
+            # Para un proyecto, el proyecto es él mismo
+            "project_id": str(row.get("project_id", row["id"])),
+            "owner_id": owner_id,
+            "op": op,
+            # created_at lo pone la base (DEFAULT now())
+        }
+
+    def append(self, entries):
+        # La escritura principal ya se hizo: un fallo aquí se registra pero no la revierte
+        entries = [entry for entry in entries if entry["owner_id"] is not None]
+        if not self.enabled or not entries:
+            return
+        try:
+            self.client.table(self.TABLE).insert(entries).execute()
+        except Exception as e:
+            print(f"Error appending to change log: {str(e)}")
+
+    def current_token(self):
+        # Token de partida: la última entrada ya asentada
+        response = self.client.table(self.VIEW).select("id") \
+            .gte("age_seconds", self.settle) \
+            .order("id", desc=True).limit(1).execute()
+        return response.data[0]["id"] if response.data else 0
+
+    def expired(self, since):
+        # Un token es el id de una entrada: si ya no está, la purga pudo borrar las siguientes
+        # (un hueco de ids por inserts revertidos no cuenta)
+        if since <= 0:
+            return False
+        response = self.client.table(self.TABLE).select("id").eq("id", since).limit(1).execute()
+        return not response.data
+
+    def read(self, since, owner_id=None):
+        """
+        Entries after ``since`` visible to ``owner_id`` (None: all), reduced to
+        the last operation per row. Returns ``(upserts, deletes, next_token,
+        has_more)`` with upserts and deletes as ``{entity: [ids]}``.
+        """
+        query = self.client.table(self.VIEW).select("*").gt("id", since)
+        if owner_id is not None:
+            query = query.eq("owner_id", str(owner_id))
+        entries = query.order("id").limit(self.page_size + 1).execute().data
+
+        has_more = len(entries) > self.page_size
+        entries = entries[:self.page_size]
+
+        next_token = since
+        for entry in entries:
+            if entry["age_seconds"] < self.settle:
+                break
+            next_token = entry["id"]
+
+        latest = {}
+        for entry in entries:
+            latest[(entry["entity"], entry["entity_id"])] = entry["op"]
+        upserts, deletes = {}, {}
+        for (entity, entity_id), op in latest.items():
+            target = deletes if op == self.DELETE else upserts
+            target.setdefault(entity, []).append(entity_id)
+
+        # Sin avance no hay página siguiente: lo pendiente aún no se asienta
+        return upserts, deletes, next_token, has_more and next_token > since
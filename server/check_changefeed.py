@@ -0,0 +1,212 @@
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import sys
+import threading
+import time
+
+# Recorre el canal de cambios (changefeed.py) contra un servidor Realtime local: suscripción por tabla,
+# filtrado, corte de la conexión, reconexión y reprocesamiento de lo escrito durante el corte
+TABLES = ("messages", "projects")
+
+
+class RealtimeStandin:
+    # Stand-in for Supabase Realtime: the Phoenix messages a postgres_changes channel uses
+    def __init__(self):
+        self.connections = set()
+        self.joins = []
+        self._ids = itertools.count(1)
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.port = self._call(self._start())
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout=10)
+
+    async def _start(self):
+        import websockets
+
+        self.server = await websockets.serve(self._handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def _handle(self, connection, path=None):
+        self.connections.add(connection)
+        try:
+            async for raw in connection:
+                message = json.loads(raw)
+                response = {}
+                if message["event"] == "phx_join":
+                    changes = message["payload"]["config"].get("postgres_changes", [])
+                    self.joins.append([change["table"] for change in changes])
+                    connection.topic = message["topic"]
+                    connection.bindings = [dict(change, id=next(self._ids)) for change in changes]
+                    response = {"postgres_changes": connection.bindings}
+                elif message["event"] != "heartbeat":
+                    continue
+                await connection.send(json.dumps({
+                    "event": "phx_reply", "topic": message["topic"], "ref": message["ref"],
+                    "payload": {"status": "ok", "response": response},
+                }))
+        except Exception:
+            pass
+        finally:
+            self.connections.discard(connection)
+
+    def emit(self, table, event, record):
+        async def send():
+            for connection in list(self.connections):
+                # Like Realtime, the ids of every binding on the channel whose filter matches
+                ids = [binding["id"] for binding in getattr(connection, "bindings", []) if binding["table"] == table]
+                await connection.send(json.dumps({
+                    "event": "postgres_changes", "topic": connection.topic, "ref": None,
+                    "payload": {"ids": ids, "data": {
+                        "type": event, "table": table, "schema": "public", "record": record, "old_record": {},
+                        "commit_timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+                    }},
+                }))
+        self._call(send())
+
+    def drop(self):
+        async def close():
+            for connection in list(self.connections):
+                await connection.close()
+        self._call(close())
+
+    def stop(self):
+        self.server.close()
+
+
+class Rows:
+    # In-memory stand-in for the PostgREST queries the replay makes
+    def __init__(self):
+        self.tables = {table: [] for table in TABLES}
+
+    def table(self, name):
+        return _Query(self.tables[name])
+
+
+class _Query:
+    def __init__(self, rows):
+        self.rows = rows
+        self.filters = []
+        self.window = None
+
+    def select(self, *columns):
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda row: row[column] >= value)
+        return self
+
+    def order(self, column):
+        self.rows = sorted(self.rows, key=lambda row: row[column])
+        return self
+
+    def range(self, start, end):
+        self.window = (start, end + 1)
+        return self
+
+    def execute(self):
+        rows = [row for row in self.rows if all(check(row) for check in self.filters)]
+        if self.window:
+            rows = rows[self.window[0]:self.window[1]]
+        return type("Response", (), {"data": rows})()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Change feed against a local realtime stand-in")
+    parser.add_argument("--timeout", type=float, default=10)
+    args = parser.parse_args()
+
+    from changefeed import ChangeFeed, RealtimeConnection, UnsupportedRealtime
+
+    standin = RealtimeStandin()
+    rows = Rows()
+    feed = ChangeFeed(rows)
+    feed.url = f"http://127.0.0.1:{standin.port}/realtime/v1"
+    feed.key = "check"
+    feed.heartbeat = 1
+    feed.resync_margin = datetime.timedelta(seconds=1)
+
+    received = []
+    feed.handler("messages", resync_column="created_at")(lambda *change: received.append(("messages",) + change))
+    feed.handler("projects")(lambda *change: received.append(("projects",) + change))
+
+    feed.ensure_started()
+
+    failures = []
+
+    def check(name, condition):
+        print(f"{'ok  ' if condition else 'FAIL'} {name}")
+        if not condition:
+            failures.append(name)
+
+    def wait(condition):
+        end = time.time() + args.timeout
+        while time.time() < end:
+            if condition():
+                return True
+            time.sleep(0.05)
+        return False
+
+    def events(table, event):
+        return [change for change in received if change[0] == table and change[1] == event]
+
+    try:
+        check("subscribes to every table with a handler",
+              wait(lambda: feed.state == "subscribed") and sorted(standin.joins[-1]) == sorted(TABLES))
+
+        standin.emit("messages", "INSERT", {"id": "m1", "created_at": "2026-01-01T00:00:00"})
+        standin.emit("projects", "UPDATE", {"id": "p1", "status": "completed"})
+        check("a change reaches its table's handler", wait(
+            lambda: len(events("messages", "INSERT")) == 1 and len(events("projects", "UPDATE")) == 1))
+        check("a change only reaches its own table's handler",
+              not any(change[2] and change[2].get("id") == "p1" for change in events("messages", "INSERT")))
+
+        received.clear()
+        rows.tables["messages"].append({"id": "old", "created_at": "2000-01-01T00:00:00"})
+        standin.drop()
+        check("notices the dropped connection", wait(lambda: feed.counters["disconnects"] == 1))
+        # Written while the feed is not listening: only the replay can deliver it
+        rows.tables["messages"].append({"id": "gap", "created_at": datetime.datetime.utcnow().isoformat()})
+
+        check("reconnects and subscribes again", wait(
+            lambda: feed.counters["connects"] == 2 and feed.state == "subscribed" and len(standin.joins) == 2))
+        check("replays rows written during the gap", wait(
+            lambda: [change[2]["id"] for change in events("messages", "INSERT")] == ["gap"]))
+        check("tables without a resync column get RESYNC", len(events("projects", ChangeFeed.RESYNC)) == 1)
+
+        standin.emit("messages", "INSERT", {"id": "m2", "created_at": "2026-01-01T00:00:01"})
+        check("changes flow again after reconnecting", wait(
+            lambda: [change[2]["id"] for change in events("messages", "INSERT")] == ["gap", "m2"]))
+
+        received.clear()
+        feed.max_replay = datetime.timedelta(0)
+        standin.drop()
+        check("a gap longer than max_replay resyncs every table", wait(
+            lambda: len(events("messages", ChangeFeed.RESYNC)) == 1 and len(events("projects", ChangeFeed.RESYNC)) == 1
+        ) and not events("messages", "INSERT"))
+
+        supported = RealtimeConnection.SUPPORTED_VERSIONS
+        try:
+            RealtimeConnection.SUPPORTED_VERSIONS = ("0.0.",)
+            RealtimeConnection(feed.url, feed.key, 1)
+            refused = False
+        except UnsupportedRealtime:
+            refused = True
+        finally:
+            RealtimeConnection.SUPPORTED_VERSIONS = supported
+        check("an unsupported realtime version is refused", refused)
+    finally:
+        feed.stop()
+        standin.drop()
+        standin.stop()
+
+    print(f"{len(failures)} failed" if failures else "all checks passed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# Paquetes que solo deben cargarse al usar el subcliente correspondiente (ver lazy_client.py)
+DEFERRED_MODULES = ("supabase", "postgrest", "storage3", "gotrue", "realtime", "supafunc",
+                    "websockets", "aiohttp", "httpx")
+
+
+def measure(module):
+    # -X importtime escribe en stderr "import time: self [us] | cumulative | imported package"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=os.environ.copy(), cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    # The output is post-order: a module's dependencies are listed right before it,
+    # after the previous top-level line (site startup imports come first)
+    block = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        top = len(name) - len(name.lstrip()) <= 1
+        block.append((name.strip(), int(self_us), int(cumulative_us)))
+        if top:
+            if name.strip() == module:
+                break
+            block = []
+    entries = block
+
+    total_us = entries[-1][2]
+    top_level = {name.split(".")[0] for name, _, _ in entries}
+    return total_us / 1000, entries, top_level
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks the import time of the server modules against a budget")
+    parser.add_argument("modules", nargs="*", default=["app"])
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_TIME_BUDGET_MS", "400")))
+    parser.add_argument("--runs", type=int, default=3, help="best of N runs, to ignore .pyc compilation and noise")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        runs = [measure(module) for _ in range(max(args.runs, 1))]
+        total_ms, entries, top_level = min(runs, key=lambda run: run[0])
+
+        print(f"import {module}: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+        for name, _, cumulative in sorted(entries[:-1], key=lambda entry: entry[2], reverse=True)[:args.top]:
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+        eager = sorted(top_level.intersection(DEFERRED_MODULES))
+        if eager:
+            print(f"  FAIL: imported eagerly: {', '.join(eager)}")
+            failed = True
+        if total_ms > args.budget_ms:
+            print("  FAIL: over budget")
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import argparse
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+# Recorre los conteos de proyectos (listings.project_status_counts y /api/projects/count) contra
+# un PostgREST local que, como el real, devuelve el total en Content-Range y no en el cuerpo
+PROJECTS = (
+    [{"user_id": "u1", "status": "pending"}] * 3
+    + [{"user_id": "u1", "status": "in_progress"}] * 2
+    + [{"user_id": "u2", "status": "completed"}] * 4
+)
+
+
+class PostgrestStandin(BaseHTTPRequestHandler):
+    # Stand-in for PostgREST counts: filters are eq.<value> params, rows never leave the server
+    protocol_version = "HTTP/1.1"
+    methods = []
+
+    def _count(self):
+        query = urlparse(self.path)
+        filters = {
+            column: value[len("eq."):]
+            for column, value in parse_qsl(query.query)
+            if value.startswith("eq.")
+        }
+        total = sum(all(row.get(column) == value for column, value in filters.items()) for row in PROJECTS)
+        limit = dict(parse_qsl(query.query)).get("limit")
+        rows = [] if limit == "0" else [{"id": str(i)} for i in range(total)]
+        return total, rows
+
+    def _respond(self, with_body):
+        self.methods.append(self.command)
+        # postgrest-py sends a JSON body even with GET; read it so the connection can be reused
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        total, rows = self._count()
+        body = json.dumps(rows).encode("utf-8") if with_body else b""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Range", f"{'*' if not rows else f'0-{len(rows) - 1}'}/{total}")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._respond(True)
+
+    def do_HEAD(self):
+        self._respond(False)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    argparse.ArgumentParser(description="Project counts against a local PostgREST stand-in").parse_args()
+
+    from postgrest import AsyncPostgrestClient, SyncPostgrestClient
+    from fanout import AsyncFanout
+    from listings import project_status_counts
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PostgrestStandin)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}/rest/v1"
+
+    async def async_client():
+        return AsyncPostgrestClient(base_url)
+
+    failures = []
+
+    def check(name, condition):
+        print(f"{'ok  ' if condition else 'FAIL'} {name}")
+        if not condition:
+            failures.append(name)
+
+    try:
+        fanout = AsyncFanout(async_client)
+        check("provider stats count every project",
+              project_status_counts(fanout) == {"total": 9, "pending": 3, "in_progress": 2, "completed": 4})
+        check("client stats only count the client's projects",
+              project_status_counts(fanout, "u1") == {"total": 5, "pending": 3, "in_progress": 2, "completed": 0})
+        check("count queries are GET requests without rows", "HEAD" not in PostgrestStandin.methods)
+
+        client = SyncPostgrestClient(base_url)
+        # The same query as GET /api/projects/count
+        response = client.table("projects").select("id", count="exact").limit(0).execute()
+        check("/api/projects/count query reads the Content-Range total", response.count == 9 and response.data == [])
+
+        head = client.table("projects").select("id", count="exact", head=True).execute()
+        check("a head-only count is not usable with this postgrest-py (reports 0)", head.count == 0)
+    finally:
+        server.shutdown()
+
+    print(f"{len(failures)} failed" if failures else "all checks passed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+import argparse
+import hashlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+import types
+
+# Recorre el protocolo de subidas reanudables (resumable_uploads.py) contra un Storage local:
+# partes, corte de conexión, reanudación, offsets inválidos, finalización, expiración y limpieza
+BUCKET = "project-documents"
+
+
+def storage_standin():
+    # Stand-in for the storage API endpoints the uploads use; objects are kept in memory
+    from flask import Flask, abort, jsonify, request
+
+    app = Flask("storage_standin")
+    objects = {}
+
+    @app.get("/storage/v1/bucket/<name>")
+    def get_bucket(name):
+        return jsonify({
+            "id": name, "name": name, "owner": "", "public": True,
+            "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00",
+            "file_size_limit": 52428800, "allowed_mime_types": ["image/jpeg", "image/png", "application/pdf"],
+        })
+
+    @app.post("/storage/v1/object/<bucket>/<path:path>")
+    def upload(bucket, path):
+        key = f"{bucket}/{path}"
+        if key in objects and request.headers.get("x-upsert") != "true":
+            return jsonify({"statusCode": "409", "error": "Duplicate", "message": "The resource already exists"}), 400
+        objects[key] = request.files["file"].read()
+        return jsonify({"Key": key})
+
+    @app.get("/storage/v1/object/public/<bucket>/<path:path>")
+    def download(bucket, path):
+        key = f"{bucket}/{path}"
+        if key not in objects:
+            abort(404)
+        return objects[key]
+
+    return app
+
+
+class DroppingStream(io.BytesIO):
+    # A request body whose connection drops after ``limit`` bytes
+    def __init__(self, data, limit):
+        super().__init__(data)
+        self.limit = limit
+
+    def read(self, size=-1):
+        if self.tell() >= self.limit:
+            raise ConnectionResetError("connection dropped")
+        return super().read(min(size, self.limit - self.tell()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumable upload protocol against a local storage stand-in")
+    parser.add_argument("--size-kb", type=int, default=3 * 1024 + 123)
+    parser.add_argument("--chunk-kb", type=int, default=1024)
+    args = parser.parse_args()
+
+    import httpx
+    from storage3 import SyncStorageClient
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from resumable_uploads import ResumableUploads, UploadConflict, UploadExpired, UploadNotFound, ChunkTooLarge
+    from storage_buckets import BucketProvisioner
+
+    app = storage_standin()
+    quiet = type("QuietHandler", (WSGIRequestHandler,), {"log_request": lambda self, *args: None})
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=quiet)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}/storage/v1"
+
+    client = types.SimpleNamespace(storage=SyncStorageClient(base_url, {"apiKey": "check", "Authorization": "Bearer check"}))
+    buckets = BucketProvisioner(client)
+    buckets.bucket(BUCKET, public=True)
+
+    failures = []
+
+    def check(name, condition):
+        print(f"{'ok  ' if condition else 'FAIL'} {name}")
+        if not condition:
+            failures.append(name)
+
+    def raises(error_type, operation):
+        try:
+            operation()
+        except error_type as e:
+            return e
+        return None
+
+    data = os.urandom(args.size_kb * 1024)
+    chunk = args.chunk_kb * 1024
+    project, user = "project-1", "user-1"
+
+    with tempfile.TemporaryDirectory() as directory:
+        uploads = ResumableUploads(buckets, BUCKET)
+        uploads.directory = directory
+        uploads.chunk_max_bytes = chunk
+
+        try:
+            session = uploads.create(project, user, "contract", "contract.pdf", len(data))
+            upload_id = session["upload_id"]
+            check("session starts at offset 0", session["offset"] == 0 and not session["complete"])
+
+            uploads.append(upload_id, project, user, 0, io.BytesIO(data[:chunk]), chunk)
+            check("first chunk advances the offset", uploads.status(upload_id, project, user)["offset"] == chunk)
+
+            dropped = raises(ConnectionResetError, lambda: uploads.append(
+                upload_id, project, user, chunk, DroppingStream(data[chunk:2 * chunk], chunk // 3), chunk
+            ))
+            offset = uploads.status(upload_id, project, user)["offset"]
+            check("a dropped chunk keeps the bytes received", dropped is not None and offset == chunk + chunk // 3)
+
+            stale = raises(UploadConflict, lambda: uploads.append(upload_id, project, user, chunk, io.BytesIO(b"x"), 1))
+            check("a stale offset is rejected with the current one", stale is not None and stale.offset == offset)
+
+            check("another user's session is not found", raises(
+                UploadNotFound, lambda: uploads.status(upload_id, project, "user-2")) is not None)
+            check("an oversized chunk is rejected", raises(
+                ChunkTooLarge, lambda: uploads.append(upload_id, project, user, offset, io.BytesIO(b""), chunk + 1)
+            ) is not None)
+            check("finalizing an incomplete upload is rejected", raises(
+                UploadConflict, lambda: uploads.finalize(upload_id, project, user, "early.pdf")) is not None)
+
+            with uploads._locked(upload_id):
+                busy = raises(UploadConflict, lambda: uploads.append(upload_id, project, user, offset, io.BytesIO(b"x"), 1))
+            check("one writer per session", busy is not None)
+
+            while offset < len(data):
+                size = min(chunk, len(data) - offset)
+                offset = uploads.append(upload_id, project, user, offset, io.BytesIO(data[offset:offset + size]), size)["offset"]
+            check("resumed upload reaches the declared size", uploads.status(upload_id, project, user)["complete"])
+
+            result = uploads.finalize(upload_id, project, user, f"{project}_contract_{upload_id}.pdf")
+            retried = uploads.finalize(upload_id, project, user, f"{project}_contract_{upload_id}.pdf")
+            stored = httpx.get(result["url"]).content
+            check("finalize can be retried (upsert)", retried["path"] == result["path"])
+            check("stored object matches the source",
+                  hashlib.sha256(stored).hexdigest() == hashlib.sha256(data).hexdigest())
+
+            path = f"{project}_contract_{upload_id}.pdf"
+            with uploads._locked(upload_id):
+                busy = raises(UploadConflict, lambda: uploads.complete(upload_id, project, user, path, lambda upload: upload))
+            check("complete is refused while another call holds the session", busy is not None)
+
+            _, recorded = uploads.complete(upload_id, project, user, path, lambda upload: None)
+            check("a failed record keeps the session for a retry",
+                  recorded is None and uploads.status(upload_id, project, user)["complete"])
+
+            _, recorded = uploads.complete(upload_id, project, user, path, lambda upload: {"path": upload["path"]})
+            check("complete records the upload and discards the session", recorded == {"path": path} and raises(
+                UploadNotFound, lambda: uploads.status(upload_id, project, user)) is not None)
+
+            stale_session = uploads.create(project, user, "other", "notes.png", 10)["upload_id"]
+            fresh_session = uploads.create(project, user, "other", "fresh.png", 10)["upload_id"]
+            past = time.time() - uploads.ttl - 1
+            os.utime(os.path.join(directory, f"{stale_session}.part"), (past, past))
+            check("an idle session expires", raises(
+                UploadExpired, lambda: uploads.status(stale_session, project, user)) is not None)
+            removed = uploads.purge_expired()
+            check("purge removes only expired sessions",
+                  removed == 1 and sorted(os.listdir(directory)) == sorted([f"{fresh_session}.json", f"{fresh_session}.part"]))
+        finally:
+            server.shutdown()
+
+    print(f"{len(failures)} failed" if failures else "all checks passed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+import base64
+import hashlib
+
+from flask import Response
+
+
+class CachedBody:
+    """
+    A serialized JSON response body and its strong ETag.
+
+    The body is serialized and hashed once, then kept in the read cache and
+    sent again as is. Serialization is deterministic (sorted keys), so every
+    worker computes the same ETag for the same data and a client's
+    If-None-Match is honored no matter which worker answers.
+    """
+
+    __slots__ = ("body", "status", "etag")
+
+    def __init__(self, body, status=200):
+        self.body = body
+        self.status = status
+        self.etag = base64.urlsafe_b64encode(hashlib.sha256(body).digest()[:18]).decode("ascii")
+
+    @classmethod
+    def from_data(cls, data, dumps, status=200):
+        return cls(dumps(data).encode("utf-8"), status)
+
+    def response(self, request):
+        response = Response(self.body, status=self.status, mimetype="application/json")
+        response.set_etag(self.etag)
+        # The browser may keep a copy but has to revalidate it; shared caches must not store it
+        response.headers["Cache-Control"] = "private, no-cache"
+        if self.status == 200:
+            # Answers 304 without a body when If-None-Match matches
+            response.make_conditional(request)
+        return response
@@ -1,6 +1,6 @@
 import os
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from lazy_client import LazySupabaseClient
 
 class Config:
     load_dotenv()
@@ -10,30 +10,46 @@ class Config:
     # Supabase configuration
     SUPABASE_URL = os.environ.get("SUPABASE_URL", os.getenv("SUPABASE_URL"))
     SUPABASE_SERVICE_KEY = os.getenv("SECRET_KEY")  # Use service role key for admin access
-    
+
+    # HTTP transport shared by the PostgREST, storage and auth sub-clients (per sub-client pool)
+    SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "20"))
+    SUPABASE_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("SUPABASE_MAX_KEEPALIVE_CONNECTIONS", "10"))
+    SUPABASE_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", "30"))
+    SUPABASE_CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "5"))
+    SUPABASE_READ_TIMEOUT = float(os.getenv("SUPABASE_READ_TIMEOUT", "30"))
+    SUPABASE_POOL_TIMEOUT = float(os.getenv("SUPABASE_POOL_TIMEOUT", "10"))
+    SUPABASE_HTTP2 = os.getenv("SUPABASE_HTTP2", "true").lower() in ("1", "true", "yes")
+    SUPABASE_PREWARM_CONNECTIONS = int(os.getenv("SUPABASE_PREWARM_CONNECTIONS", "2"))
+
+    @staticmethod
+    def transport_settings():
+        # Importado aquí: transport trae httpx, que solo hace falta al construir un subcliente
+        from transport import TransportSettings
+        return TransportSettings(
+            max_connections=Config.SUPABASE_MAX_CONNECTIONS,
+            max_keepalive_connections=Config.SUPABASE_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=Config.SUPABASE_KEEPALIVE_EXPIRY,
+            connect_timeout=Config.SUPABASE_CONNECT_TIMEOUT,
+            read_timeout=Config.SUPABASE_READ_TIMEOUT,
+            write_timeout=Config.SUPABASE_READ_TIMEOUT,
+            pool_timeout=Config.SUPABASE_POOL_TIMEOUT,
+            http2=Config.SUPABASE_HTTP2,
+            prewarm_connections=Config.SUPABASE_PREWARM_CONNECTIONS
+        )
+
+    @staticmethod
+    def get_supabase_client() -> LazySupabaseClient:
+        # Cada subcliente (postgrest, storage, auth, realtime) se importa y construye en su primer uso
+        return LazySupabaseClient(Config.SUPABASE_URL, Config.SUPABASE_SERVICE_KEY, Config.transport_settings)
+
     @staticmethod
-    def get_supabase_client() -> Client:
+    async def get_async_supabase_client():
+        from supabase import create_async_client
+        from transport import configure_async_client
         if not Config.SUPABASE_URL or not Config.SUPABASE_SERVICE_KEY:
             raise ValueError("Supabase URL and Service Key must be configured")
-        return create_client(Config.SUPABASE_URL, Config.SUPABASE_SERVICE_KEY)
-
-def create_bucket_if_not_exists(client: Client, bucket_name: str) -> bool:
-    try:
-        buckets = client.storage.list_buckets()
-        if not any(bucket.name == bucket_name for bucket in buckets):
-            client.storage.create_bucket(bucket_name, options={
-                'public': True,
-                'file_size_limit': 52428800,  # 50MB in bytes
-                'allowed_mime_types': [
-                    'image/jpeg',
-                    'image/png',
-                    'application/pdf'
-                ]
-            })
-        return True
-    except Exception as e:
-        print(f"Error creating bucket: {str(e)}")
-        return False
+        client = await create_async_client(Config.SUPABASE_URL, Config.SUPABASE_SERVICE_KEY)
+        return await configure_async_client(client, Config.transport_settings())
 
 # Create a global Supabase client instance
 supabase = Config.get_supabase_client()
\ No newline at end of file
@@ -0,0 +1,211 @@
+import io
+import mimetypes
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from uploads import upload_source
+
+
+class ProgressReader(io.BufferedReader):
+    # storage3 only streams BufferedReader objects; this one reports the bytes httpx has read
+    def __init__(self, raw, on_read):
+        super().__init__(raw)
+        self._on_read = on_read
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        if chunk:
+            self._on_read(len(chunk))
+        return chunk
+
+
+class FileUpload:
+    """Progress and outcome of one document of a batch."""
+
+    def __init__(self, role, file_storage, path):
+        self.role = role
+        self.file = file_storage
+        self.filename = file_storage.filename
+        self.path = path
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.size = None
+        self.bytes_sent = 0
+        self.status = "pending"  # pending, uploading, uploaded, failed, rolled_back, orphaned
+        self.url = None
+        self.error = None
+        self.duration_ms = None
+
+    def to_dict(self):
+        return {
+            "role": self.role,
+            "filename": self.filename,
+            "path": self.path,
+            "status": self.status,
+            "size": self.size,
+            "bytes_sent": self.bytes_sent,
+            "url": self.url,
+            "error": self.error,
+            "duration_ms": self.duration_ms,
+        }
+
+
+class _Batch:
+    # Cancelled when the batch times out; the lock orders that with each file's outcome
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cancelled = False
+
+
+class DocumentUploader:
+    """
+    Uploads the documents of a request to storage concurrently.
+
+    The files of a batch are uploaded on a per-process pool of
+    UPLOAD_WORKERS threads, streamed from their spooled parts. A batch uses
+    at most UPLOAD_WORKERS_PER_REQUEST of those threads, so one request with
+    many files does not hold up the uploads of the others, and waits at most
+    UPLOAD_TIMEOUT_SECONDS. ``on_progress`` is called with a ``FileUpload``
+    when a file starts, roughly every ``progress_step`` of its bytes and when
+    it finishes. If any file fails or the batch times out, the files of the
+    batch already in storage are deleted again, so a failed request leaves
+    nothing behind; ``discard`` does the same for a batch whose database
+    insert failed. Files that could not be deleted are marked ``orphaned``.
+    """
+
+    def __init__(self, buckets, bucket_name, app=None):
+        self.buckets = buckets
+        self.bucket_name = bucket_name
+        self.progress_step = 0.1
+        self.per_request = 2
+        self.timeout = 120
+        self._executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        workers = app.config.setdefault("UPLOAD_WORKERS", 4)
+        self.per_request = app.config.setdefault("UPLOAD_WORKERS_PER_REQUEST", max(1, workers // 2))
+        self.timeout = app.config.setdefault("UPLOAD_TIMEOUT_SECONDS", 120)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="document-upload")
+        app.extensions["document_uploader"] = self
+
+    def upload(self, uploads, on_progress=None):
+        # Returns True when every file was uploaded; otherwise the uploaded ones are rolled back
+        report = on_progress or (lambda upload: None)
+        pending = queue.SimpleQueue()
+        for upload in uploads:
+            pending.put(upload)
+        batch = _Batch()
+
+        def lane():
+            # Each lane takes the next file of the batch until none is left
+            while not batch.cancelled:
+                try:
+                    upload = pending.get_nowait()
+                except queue.Empty:
+                    return
+                self._upload_one(upload, report, batch)
+
+        lanes = [self._executor.submit(lane) for _ in range(min(self.per_request, len(uploads)))]
+        _, not_done = wait(lanes, timeout=self.timeout)
+        if not_done:
+            # Files still running are removed by their own thread when they finish
+            with batch.lock:
+                batch.cancelled = True
+                timed_out = [upload for upload in uploads if upload.status in ("pending", "uploading")]
+                for upload in timed_out:
+                    upload.status = "failed"
+                    upload.error = f"Tiempo de subida agotado ({self.timeout} s)"
+            for upload in timed_out:
+                report(upload)
+            print(f"Upload batch timed out after {self.timeout} s")
+
+        if all(upload.status == "uploaded" for upload in uploads):
+            return True
+        self.discard(uploads, report)
+        return False
+
+    def discard(self, uploads, on_progress=None):
+        uploaded = [upload for upload in uploads if upload.status == "uploaded"]
+        if not uploaded:
+            return
+        try:
+            self.buckets.call(self.bucket_name, lambda bucket: bucket.remove([upload.path for upload in uploaded]))
+            status, error = "rolled_back", None
+        except Exception as e:
+            # Quedan objetos huérfanos: se registran para limpiarlos a mano
+            print(f"Error rolling back uploads {[upload.path for upload in uploaded]}: {str(e)}")
+            status, error = "orphaned", str(e)
+        for upload in uploaded:
+            upload.status = status
+            upload.error = error
+            if status == "rolled_back":
+                upload.url = None
+            if on_progress is not None:
+                on_progress(upload)
+
+    def _upload_one(self, upload, report, batch):
+        start = time.perf_counter()
+        upload.status = "uploading"
+        report(upload)
+        uploaded = False
+        try:
+            with upload_source(upload.file) as data:
+                body = self._with_progress(data, upload, report)
+                try:
+                    self.buckets.call(self.bucket_name, lambda bucket: bucket.upload(
+                        path=upload.path,
+                        file=body,
+                        file_options={"content-type": upload.content_type}
+                    ))
+                finally:
+                    if body is not data:
+                        body.close()
+            uploaded = True
+        except Exception as e:
+            print(f"Error uploading {upload.path}: {str(e)}")
+            error = str(e)
+
+        with batch.lock:
+            late = batch.cancelled
+            if not late:
+                if uploaded:
+                    upload.bytes_sent = upload.size
+                    upload.url = self.buckets.client.storage.from_(self.bucket_name).get_public_url(upload.path)
+                    upload.status = "uploaded"
+                else:
+                    upload.status = "failed"
+                    upload.error = error
+                upload.duration_ms = round((time.perf_counter() - start) * 1000, 1)
+
+        if not late:
+            report(upload)
+        elif uploaded:
+            # The batch timed out and already answered with this file as failed: it is not kept
+            try:
+                self.buckets.call(self.bucket_name, lambda bucket: bucket.remove([upload.path]))
+            except Exception as e:
+                print(f"Error removing {upload.path} after the batch timed out: {str(e)}")
+
+    def _with_progress(self, data, upload, report):
+        if isinstance(data, bytes):
+            upload.size = len(data)
+            return data
+
+        upload.size = os.fstat(data.fileno()).st_size
+        step = max(int(upload.size * self.progress_step), 1)
+        lock = threading.Lock()
+        reported = [0]
+
+        def on_read(count):
+            # A retried upload reads the file again: the count stops at the size
+            with lock:
+                upload.bytes_sent = min(upload.bytes_sent + count, upload.size)
+                if upload.bytes_sent - reported[0] >= step:
+                    reported[0] = upload.bytes_sent
+                    report(upload)
+
+        return ProgressReader(io.FileIO(os.dup(data.fileno()), "rb"), on_read)
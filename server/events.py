@@ -0,0 +1,295 @@
+import asyncio
+import json
+import os
+import secrets
+import threading
+from collections import OrderedDict, deque
+
+
+class Event:
+    __slots__ = ("seq", "id", "scope", "frame")
+
+    def __init__(self, seq, event_id, scope, event_type, data):
+        self.seq = seq
+        self.id = event_id
+        self.scope = scope
+        payload = json.dumps(data, separators=(",", ":"), default=str)
+        self.frame = f"id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n".encode("utf-8")
+
+
+class Subscriber:
+    __slots__ = ("scope", "since", "queue", "overflowed")
+
+    def __init__(self, scope, since, buffer_size):
+        self.scope = scope
+        self.since = since
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        self.overflowed = False
+
+    def wants(self, event):
+        # scope None: a provider, who sees every project
+        return event.seq > self.since and (self.scope is None or self.scope == event.scope)
+
+
+class EventStream:
+    """
+    In-process pub/sub delivered to browsers as Server-Sent Events.
+
+    Write handlers call ``publish`` with the scope an event belongs to (the
+    project owner); the owner's connections and every provider connection
+    receive it. Connections are served by a small aiohttp server on its own
+    event loop thread and port, started once per process, so an idle
+    subscriber costs a coroutine and a bounded queue instead of a gunicorn
+    worker thread. Every worker binds the same port with SO_REUSEPORT, so a
+    connection may land on any of them: with several workers each one must
+    also see the writes of the others, which the change feed provides, and
+    ``check_processes`` refuses to run without it.
+
+    Event ids are ``<epoch>-<seq>``, the epoch being random per process, so
+    resuming is only exact within one worker. A reconnect with a
+    ``Last-Event-ID`` still in this process' history gets the missed events
+    replayed; otherwise (another worker, a restart or too old) it gets a
+    ``reset`` event and the client should refetch. A subscriber
+    whose queue fills up also gets ``reset`` instead of the dropped events.
+
+    ``publish`` takes an optional dedupe ``key`` and ``version``: an event is
+    dropped when the last event published with that key had the same version,
+    so a row published by the write handler and seen again on the change feed
+    is sent once.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.host = "127.0.0.1"
+        self.port = 5001
+        self.buffer_size = 256
+        self.history_size = 1000
+        self.heartbeat = 20
+        self.retry_ms = 3000
+        self.allowed_origins = ()
+        self.state = "stopped"
+        self.counters = {"published": 0, "deduplicated": 0, "delivered": 0, "overflows": 0,
+                         "replayed": 0, "resets": 0, "connections": 0, "rejected": 0}
+        self._authenticate = None
+        self._subscribers = set()
+        self._history = deque()
+        self._dedupe = OrderedDict()  # key -> version
+        self._dedupe_max_entries = 10000
+        self._seq = 0
+        self._epoch = None
+        self._loop = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.host = app.config.setdefault("EVENTS_HOST", "127.0.0.1")
+        self.port = app.config.setdefault("EVENTS_PORT", 5001)
+        self.buffer_size = app.config.setdefault("EVENTS_BUFFER_SIZE", 256)
+        self.history_size = app.config.setdefault("EVENTS_HISTORY_SIZE", 1000)
+        self.heartbeat = app.config.setdefault("EVENTS_HEARTBEAT_SECONDS", 20)
+        self.allowed_origins = tuple(app.config.setdefault("EVENTS_ALLOWED_ORIGINS", ["http://localhost:5173"]))
+        self.enabled = app.config.setdefault("EVENTS_ENABLED", False)
+        if self.enabled:
+            app.before_request(self.ensure_started)
+        app.extensions["events"] = self
+
+    def check_processes(self, processes, shared_source):
+        # A process only delivers what it publishes itself or receives from the change feed
+        if self.enabled and processes > 1 and not shared_source:
+            raise RuntimeError(
+                f"EVENTS_ENABLED with {processes} workers requires CHANGE_FEED_ENABLED: "
+                "without it a subscriber only sees the writes of the worker it is connected to"
+            )
+
+    def authenticator(self, callback):
+        # callback(token) -> scope (None for providers); raises if the token is not valid
+        self._authenticate = callback
+        return callback
+
+    def publish(self, scope, event_type, data, key=None, version=None):
+        if not self.enabled:
+            return None
+        self.ensure_started()
+        with self._lock:
+            if key is not None:
+                if key in self._dedupe and self._dedupe[key] == version:
+                    self.counters["deduplicated"] += 1
+                    return None
+                self._dedupe[key] = version
+                self._dedupe.move_to_end(key)
+                while len(self._dedupe) > self._dedupe_max_entries:
+                    self._dedupe.popitem(last=False)
+
+            self._seq += 1
+            event = Event(self._seq, f"{self._epoch}-{self._seq}", None if scope is None else str(scope),
+                          event_type, data)
+            self._history.append(event)
+            while len(self._history) > self.history_size:
+                self._history.popleft()
+            self.counters["published"] += 1
+        self._loop.call_soon_threadsafe(self._deliver, event)
+        return event.id
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # A forked worker starts over: its own epoch, history and server
+            self._epoch = secrets.token_hex(4)
+            self._seq = 0
+            self._history = deque()
+            self._dedupe = OrderedDict()
+            self._subscribers = set()
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._run, name="event-stream", daemon=True).start()
+            self._pid = os.getpid()
+
+    def status(self):
+        return {
+            "state": self.state,
+            "subscribers": len(self._subscribers),
+            "history": len(self._history),
+            **self.counters,
+        }
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._serve())
+        except Exception as e:
+            # Keep the loop running anyway so published events do not pile up
+            self.state = "failed"
+            print(f"Error starting event stream on {self.host}:{self.port}: {str(e)}")
+        self._loop.run_forever()
+
+    async def _serve(self):
+        from aiohttp import web
+
+        server = web.Application()
+        server.router.add_get("/api/events", self._handle)
+        server.router.add_route("OPTIONS", "/api/events", self._preflight)
+        runner = web.AppRunner(server, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, self.host, self.port, reuse_port=True).start()
+        self.state = "serving"
+
+    def _deliver(self, event):
+        for subscriber in self._subscribers:
+            if not subscriber.wants(event):
+                continue
+            try:
+                subscriber.queue.put_nowait(event)
+                self.counters["delivered"] += 1
+            except asyncio.QueueFull:
+                # Slow reader: drop what is queued, it will be told to refetch
+                self.counters["overflows"] += 1
+                subscriber.overflowed = True
+                while not subscriber.queue.empty():
+                    subscriber.queue.get_nowait()
+                subscriber.queue.put_nowait(event)
+
+    def _subscribe(self, scope, last_event_id):
+        # Runs on the loop, like _deliver: events published before this point come
+        # from the history, later ones through the queue
+        with self._lock:
+            subscriber = Subscriber(scope, self._seq, self.buffer_size)
+            replay = None
+            epoch, _, seq = (last_event_id or "").partition("-")
+            if epoch == self._epoch and seq.isdigit():
+                oldest = self._history[0].seq if self._history else self._seq + 1
+                if int(seq) + 1 >= oldest:
+                    replay = [event for event in self._history
+                              if event.seq > int(seq) and (scope is None or scope == event.scope)]
+        self._subscribers.add(subscriber)
+        return subscriber, replay
+
+    def _cors_headers(self, request):
+        origin = request.headers.get("Origin")
+        if origin in self.allowed_origins:
+            return {"Access-Control-Allow-Origin": origin, "Access-Control-Allow-Credentials": "true",
+                    "Vary": "Origin"}
+        return {}
+
+    async def _preflight(self, request):
+        from aiohttp import web
+
+        headers = self._cors_headers(request)
+        if headers:
+            headers["Access-Control-Allow-Methods"] = "GET"
+            headers["Access-Control-Allow-Headers"] = "Authorization, Last-Event-ID"
+        return web.Response(status=204, headers=headers)
+
+    async def _authorize(self, token):
+        def check():
+            with self.app.app_context():
+                return self._authenticate(token)
+        return await asyncio.get_running_loop().run_in_executor(None, check)
+
+    async def _handle(self, request):
+        from aiohttp import web
+
+        headers = self._cors_headers(request)
+        # EventSource cannot send headers: the token may come as ?access_token=
+        token = request.query.get("access_token")
+        authorization = request.headers.get("Authorization", "")
+        if authorization.startswith("Bearer "):
+            token = authorization[len("Bearer "):]
+        if not token or self._authenticate is None:
+            self.counters["rejected"] += 1
+            return web.json_response({"error": "Autorización requerida"}, status=401, headers=headers)
+        try:
+            scope = await self._authorize(token)
+        except Exception:
+            self.counters["rejected"] += 1
+            return web.json_response({"error": "Token inválido"}, status=401, headers=headers)
+        scope = None if scope is None else str(scope)
+
+        response = web.StreamResponse(headers={
+            **headers,
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # nginx: do not buffer the stream
+        })
+        await response.prepare(request)
+
+        last_event_id = request.headers.get("Last-Event-ID") or request.query.get("lastEventId")
+        subscriber, replay = self._subscribe(scope, last_event_id)
+        self.counters["connections"] += 1
+        try:
+            await response.write(f"retry: {self.retry_ms}\n\n".encode("utf-8"))
+            if last_event_id and replay is None:
+                await self._send_reset(response)
+            for event in replay or ():
+                self.counters["replayed"] += 1
+                await response.write(event.frame)
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle stream, and drops revoked or expired tokens
+                    try:
+                        await self._authorize(token)
+                    except Exception:
+                        break
+                    await response.write(b": ping\n\n")
+                    continue
+                if subscriber.overflowed:
+                    subscriber.overflowed = False
+                    await self._send_reset(response)
+                await response.write(event.frame)
+        except ConnectionResetError:
+            pass
+        finally:
+            self._subscribers.discard(subscriber)
+        return response
+
+    async def _send_reset(self, response):
+        self.counters["resets"] += 1
+        await response.write(b"event: reset\ndata: {}\n\n")
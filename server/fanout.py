@@ -0,0 +1,63 @@
+import asyncio
+import os
+import threading
+
+
+class AsyncFanout:
+    """
+    Runs independent Supabase queries concurrently from sync Flask views.
+
+    Each process owns one event loop in a daemon thread and one async Supabase
+    client bound to it, both created on first use (so they are never shared
+    across a fork). A view hands over several query factories, each receiving
+    the async client, and blocks only until the slowest of them finishes.
+    """
+
+    def __init__(self, client_factory, app=None):
+        self.client_factory = client_factory
+        self.timeout = 30
+        self._loop = None
+        self._client_future = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.timeout = app.config.setdefault("FANOUT_TIMEOUT_SECONDS", 30)
+        app.extensions["fanout"] = self
+
+    def gather(self, *queries):
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self._gather(queries), loop)
+        return future.result(timeout=self.timeout)
+
+    def run(self, coroutine):
+        # Runs an arbitrary coroutine on the fan-out loop and waits for its result
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result(timeout=self.timeout)
+
+    async def client(self):
+        # Created once per loop; a failed creation is retried on the next call
+        if self._client_future.done() and self._client_future.exception() is not None:
+            self._client_future = asyncio.ensure_future(self.client_factory())
+        return await self._client_future
+
+    async def _create_client_future(self):
+        return asyncio.ensure_future(self.client_factory())
+
+    async def _gather(self, queries):
+        client = await self.client()
+        return await asyncio.gather(*(query(client) for query in queries))
+
+    def _ensure_loop(self):
+        if self._pid == os.getpid():
+            return self._loop
+        with self._lock:
+            if self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="supabase-fanout", daemon=True).start()
+                self._client_future = asyncio.run_coroutine_threadsafe(self._create_client_future(), loop).result()
+                self._loop = loop
+                self._pid = os.getpid()
+            return self._loop
@@ -0,0 +1,63 @@
+import multiprocessing
+import os
+
+# Servidor de producción: gunicorn -c gunicorn.conf.py wsgi:app
+bind = os.getenv("GUNICORN_BIND", "127.0.0.1:5000")
+
+# Procesos (dos por núcleo más uno) con varios hilos cada uno: las vistas pasan
+# casi todo el tiempo esperando a Supabase, así que los hilos cubren la E/S y los
+# procesos el trabajo de CPU (bcrypt, JSON, JWT)
+workers = int(os.getenv("GUNICORN_WORKERS", str(multiprocessing.cpu_count() * 2 + 1)))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# Los hilos de bcrypt son por proceso y cada worker necesita al menos uno: se reparten
+# los núcleos entre los workers, pero el total es max(núcleos, workers). Con los workers
+# por defecto (más que núcleos) cada uno tiene un hilo y pueden correr más hashes que
+# núcleos a la vez; para acotarlos a los núcleos, GUNICORN_WORKERS <= núcleos.
+# Este archivo se evalúa antes de cargar la app
+os.environ.setdefault("PASSWORD_HASH_WORKERS", str(max(1, multiprocessing.cpu_count() // workers)))
+
+# La app, el cliente de Supabase y la calibración de bcrypt se cargan una sola vez
+# en el maestro y los workers los heredan al hacer fork
+preload_app = True
+
+# Reciclar cada worker tras N peticiones (con jitter para que no reinicien a la vez)
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+
+# SIGTERM / SIGHUP: los workers dejan de aceptar conexiones y terminan las peticiones en curso
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+
+
+def on_starting(server):
+    # Con varios workers, cada uno solo ve las escrituras de los demás a través del canal de cambios
+    from app import change_feed, event_stream
+
+    event_stream.check_processes(server.cfg.workers, change_feed.enabled)
+
+
+def when_ready(server):
+    # Se verifica el bucket una sola vez, en el maestro: los workers heredan el resultado
+    from app import storage_buckets
+
+    storage_buckets.provision()
+
+
+def post_fork(server, worker):
+    # Las conexiones HTTP del cliente precargado no se pueden compartir entre procesos:
+    # cada worker descarta los subclientes heredados y arma los suyos
+    from app import event_stream
+    from config import Config, supabase
+    from transport import prewarm
+
+    supabase.reset()
+    prewarm(supabase, Config.transport_settings())
+    # Cada worker abre su servidor de /api/events en EVENTS_PORT (SO_REUSEPORT)
+    if event_stream.enabled:
+        event_stream.ensure_started()
@@ -0,0 +1,111 @@
+import math
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+
+class HashingBusy(Exception):
+    """Raised when the password hashing pool has no room for another job."""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt work on a dedicated, bounded thread pool.
+
+    Request threads wait for their own job but never queue behind more than
+    PASSWORD_HASH_MAX_PENDING others: when the pool is saturated HashingBusy
+    is raised right away so the caller can answer 503 instead of piling up.
+
+    The bcrypt cost is BCRYPT_LOG_ROUNDS. Without it, ``init_app`` calibrates
+    one for BCRYPT_TARGET_MS and stores it in that config key, so init_app
+    must run before Flask-Bcrypt's for both to hash with the same cost.
+    """
+
+    def __init__(self, bcrypt, app=None):
+        self.bcrypt = bcrypt
+        self.timeout = 10
+        self.log_rounds = 12
+        self._executor = None
+        self._slots = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        workers = app.config.setdefault("PASSWORD_HASH_WORKERS", os.cpu_count() or 2)
+        max_pending = app.config.setdefault("PASSWORD_HASH_MAX_PENDING", workers * 4)
+        self.timeout = app.config.setdefault("PASSWORD_HASH_TIMEOUT_SECONDS", 10)
+
+        # An explicit BCRYPT_LOG_ROUNDS wins over calibration
+        target_ms = app.config.get("BCRYPT_TARGET_MS")
+        if "BCRYPT_LOG_ROUNDS" not in app.config and target_ms:
+            app.config["BCRYPT_LOG_ROUNDS"] = self.calibrate(
+                target_ms,
+                app.config.get("BCRYPT_MIN_LOG_ROUNDS", 10),
+                samples=app.config.get("BCRYPT_CALIBRATION_SAMPLES", 5),
+            )
+            print(f"bcrypt calibrated to {app.config['BCRYPT_LOG_ROUNDS']} rounds for a {target_ms} ms target")
+        self.log_rounds = app.config.setdefault("BCRYPT_LOG_ROUNDS", 12)
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        app.extensions["password_hasher"] = self
+
+    def calibrate(self, target_ms, min_rounds=10, max_rounds=16, samples=5):
+        # Each extra round doubles the cost, so timing the floor is enough; the
+        # median keeps one sample slowed by startup work from skewing the result
+        timings = []
+        for _ in range(max(samples, 1)):
+            start = time.perf_counter()
+            self.bcrypt.generate_password_hash("calibration-password", rounds=min_rounds)
+            timings.append((time.perf_counter() - start) * 1000)
+        elapsed_ms = max(statistics.median(timings), 0.001)
+        extra = int(math.floor(math.log2(target_ms / elapsed_ms))) if target_ms > elapsed_ms else 0
+        return max(min_rounds, min(max_rounds, min_rounds + extra))
+
+    def generate_password_hash(self, password):
+        return self._run(self.bcrypt.generate_password_hash, password, self.log_rounds).decode('utf-8')
+
+    def check_password_hash(self, pw_hash, password):
+        return self._run(self.bcrypt.check_password_hash, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        # bcrypt hashes look like $2b$<cost>$<salt+digest>
+        try:
+            return int(pw_hash.split('$')[2]) < self.log_rounds
+        except (IndexError, ValueError):
+            return False
+
+    def rehash_in_background(self, password, on_hashed):
+        # Best effort: if the pool is busy the next login will try again
+        if not self._slots.acquire(blocking=False):
+            return False
+
+        def job():
+            try:
+                on_hashed(self.bcrypt.generate_password_hash(password, self.log_rounds).decode('utf-8'))
+            except Exception as e:
+                print(f"Error rehashing password: {str(e)}")
+
+        self._submit(job)
+        return True
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy()
+        future = self._submit(fn, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise HashingBusy()
+
+    def _submit(self, fn, *args):
+        # The caller has already taken a slot; it is given back when the job ends
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
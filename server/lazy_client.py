@@ -0,0 +1,129 @@
+import re
+import threading
+
+
+class LazySupabaseClient:
+    """
+    Drop-in for supabase.Client that builds each sub-client on first use.
+
+    Importing ``supabase`` eagerly imports and constructs every sub-client
+    (gotrue, storage3, realtime, supafunc and with them websockets and
+    aiohttp). This facade imports a sub-client package only when that
+    sub-client is first touched, so a process that only queries tables never
+    loads the rest. Each sub-client gets the pooled transport from
+    ``transport`` when a ``settings_factory`` is given.
+
+    Auth state changes are not propagated to the other sub-clients: the
+    server always talks to Supabase with the service key.
+    """
+
+    def __init__(self, supabase_url, supabase_key, settings_factory=None):
+        if not supabase_url or not supabase_key:
+            raise ValueError("Supabase URL and Service Key must be configured")
+        if not re.match(r"^(https?)://.+", supabase_url):
+            raise ValueError("Invalid Supabase URL")
+
+        self.supabase_url = supabase_url
+        self.supabase_key = supabase_key
+        self.settings_factory = settings_factory
+        self.headers = {"apiKey": supabase_key, "Authorization": f"Bearer {supabase_key}"}
+        self.rest_url = f"{supabase_url}/rest/v1"
+        self.auth_url = f"{supabase_url}/auth/v1"
+        self.storage_url = f"{supabase_url}/storage/v1"
+        self.functions_url = f"{supabase_url}/functions/v1"
+        self.realtime_url = f"{supabase_url}/realtime/v1".replace("http", "ws")
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    @property
+    def postgrest(self):
+        return self._get("postgrest", self._build_postgrest)
+
+    @property
+    def storage(self):
+        return self._get("storage", self._build_storage)
+
+    @property
+    def auth(self):
+        return self._get("auth", self._build_auth)
+
+    @property
+    def realtime(self):
+        return self._get("realtime", self._build_realtime)
+
+    @property
+    def functions(self):
+        return self._get("functions", self._build_functions)
+
+    def table(self, table_name):
+        return self.postgrest.from_(table_name)
+
+    def from_(self, table_name):
+        return self.postgrest.from_(table_name)
+
+    def schema(self, schema):
+        return self.postgrest.schema(schema)
+
+    def rpc(self, fn, params=None):
+        return self.postgrest.rpc(fn, params or {})
+
+    def loaded(self):
+        return sorted(self._clients)
+
+    def reset(self):
+        # Forgets built sub-clients without closing them: after a fork their
+        # sockets still belong to the parent, so the child just starts over
+        with self._lock:
+            self._clients = {}
+
+    def _get(self, name, build):
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = self._clients[name] = build()
+        return client
+
+    def _settings(self):
+        return self.settings_factory() if self.settings_factory is not None else None
+
+    def _build_postgrest(self):
+        from postgrest import SyncPostgrestClient
+        from transport import configure_postgrest
+
+        client = SyncPostgrestClient(self.rest_url, schema="public", headers=dict(self.headers))
+        settings = self._settings()
+        return configure_postgrest(client, settings) if settings is not None else client
+
+    def _build_storage(self):
+        from storage3 import SyncStorageClient
+        from storage3.constants import DEFAULT_TIMEOUT
+        from transport import configure_storage
+
+        client = SyncStorageClient(self.storage_url, dict(self.headers), DEFAULT_TIMEOUT)
+        settings = self._settings()
+        return configure_storage(client, settings) if settings is not None else client
+
+    def _build_auth(self):
+        from gotrue import SyncGoTrueClient, SyncMemoryStorage
+        from transport import configure_auth
+
+        client = SyncGoTrueClient(
+            url=self.auth_url,
+            headers=dict(self.headers),
+            storage=SyncMemoryStorage(),
+            flow_type="implicit"
+        )
+        settings = self._settings()
+        return configure_auth(client, settings) if settings is not None else client
+
+    def _build_realtime(self):
+        from realtime import SyncRealtimeClient
+
+        return SyncRealtimeClient(self.realtime_url, token=self.supabase_key)
+
+    def _build_functions(self):
+        from supafunc import SyncFunctionsClient
+
+        return SyncFunctionsClient(self.functions_url, dict(self.headers), 5)
@@ -0,0 +1,212 @@
+import base64
+import datetime
+import json
+from uuid import UUID
+
+DEFAULT_PAGE_SIZE = 50
+BUNDLE_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 200
+STREAM_PAGE_SIZE = 500
+
+
+class Listing:
+    """
+    A list endpoint expressed as one PostgREST query.
+
+    Related rows are pulled in with resource embedding (``projects(users(...))``)
+    instead of a second ``in_`` query, and ``formatter`` turns each row into the
+    shape the client already expects. ``scope_column`` is the column, possibly
+    on an embedded resource, that restricts the listing to one user or project.
+
+    Rows are returned newest first, ordered by ``(created_at, id)`` so pages
+    can be addressed with a keyset cursor instead of an offset.
+    """
+
+    def __init__(self, table, columns, scope_column, formatter=None):
+        self.table = table
+        self.columns = columns
+        self.scope_column = scope_column
+        self.formatter = formatter
+
+    def query(self, client, scope=None):
+        query = client.table(self.table).select(self.columns)
+        if scope is not None:
+            query = query.eq(self.scope_column, scope)
+        return query.order("created_at", desc=True).order("id", desc=True)
+
+    def format(self, rows):
+        if self.formatter is None:
+            return rows
+        return [self.formatter(row) for row in rows]
+
+    def fetch(self, client, scope=None):
+        return self.format(self.query(client, scope).execute().data)
+
+    def page_query(self, client, scope=None, limit=DEFAULT_PAGE_SIZE, cursor=None):
+        # Works with the sync and the async client alike; the caller executes it
+        query = self.query(client, scope)
+        if cursor is not None:
+            created_at, row_id = decode_cursor(cursor)
+            # Rows strictly after the cursor in (created_at desc, id desc) order
+            query = query.or_(
+                f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{row_id})'
+            )
+        # One extra row tells whether there is a next page without a count query
+        return query.limit(limit + 1)
+
+    def page_result(self, rows, limit=DEFAULT_PAGE_SIZE):
+        next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        return self.format(rows[:limit]), next_cursor
+
+    def page(self, client, scope=None, limit=DEFAULT_PAGE_SIZE, cursor=None):
+        rows = self.page_query(client, scope, limit, cursor).execute().data
+        return self.page_result(rows, limit)
+
+    def iter_pages(self, client, scope=None, page_size=STREAM_PAGE_SIZE):
+        # Walks the whole listing one keyset page at a time
+        cursor = None
+        while True:
+            rows, cursor = self.page(client, scope, page_size, cursor)
+            yield rows
+            if cursor is None:
+                return
+
+
+def iter_json_array(pages, dumps, on_error=None):
+    # Serializes a JSON array one page at a time, so only a page is ever held in memory.
+    # The status line is already sent when a later page fails: with on_error the error is
+    # reported there and the array is closed, so the body stays valid JSON (but truncated).
+    yield "["
+    first = True
+    try:
+        for rows in pages:
+            if not rows:
+                continue
+            yield ("" if first else ",") + ",".join(dumps(row) for row in rows)
+            first = False
+    except Exception as e:
+        if on_error is None:
+            raise
+        on_error(e)
+    yield "]"
+
+
+def encode_cursor(row):
+    raw = json.dumps([row["created_at"], row["id"]], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise ValueError("Cursor inválido")
+    # Both values end up inside a PostgREST filter, so only accept well-formed ones
+    try:
+        datetime.datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+        row_id = row_id if isinstance(row_id, int) else str(UUID(row_id))
+    except (AttributeError, TypeError, ValueError):
+        raise ValueError("Cursor inválido")
+    return created_at, row_id
+
+
+def stream_requested(args):
+    return args.get('stream', '').lower() in ('1', 'true', 'yes')
+
+
+def page_args(args):
+    # Pagination is opt-in: without limit/cursor the endpoint keeps returning the whole list
+    if 'limit' not in args and 'cursor' not in args:
+        return None
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("limit inválido")
+    if limit < 1:
+        raise ValueError("limit inválido")
+    cursor = args.get('cursor') or None
+    if cursor is not None:
+        decode_cursor(cursor)
+    return min(limit, MAX_PAGE_SIZE), cursor
+
+
+PROJECT_STATUSES = ('pending', 'in_progress', 'completed')
+
+
+def project_status_counts(fanout, user_id=None):
+    # Count queries with limit=0: PostgREST returns an empty array and the total in
+    # Content-Range. Not head=True: postgrest-py fails to parse the empty HEAD body
+    # and reports a count of 0. The total and every status are counted concurrently.
+    def count(status=None):
+        def query(client):
+            builder = client.table("projects").select("id", count="exact").limit(0)
+            if user_id is not None:
+                builder = builder.eq("user_id", user_id)
+            if status is not None:
+                builder = builder.eq("status", status)
+            return builder.execute()
+        return query
+
+    names = ("total",) + PROJECT_STATUSES
+    responses = fanout.gather(count(), *(count(status) for status in PROJECT_STATUSES))
+    return {name: response.count or 0 for name, response in zip(names, responses)}
+
+
+def client_scope(current_user):
+    # Clients only see their own rows; providers see everything
+    return current_user['id'] if current_user['role'] == 'client' else None
+
+
+def _format_project(project):
+    user = project.get("users") or {}
+    return {
+        "project_id": project["id"],
+        "project_name": project["name"],
+        "project_description": project["description"],
+        "project_status": project["status"],
+        "project_created_at": project["created_at"],
+        "user_id": project["user_id"],
+        "user_name": user.get("name"),
+        "user_email": user.get("email"),
+    }
+
+
+def _format_message(msg):
+    project = msg.get("projects") or {}
+    return {
+        'id': msg['id'],
+        'content': msg['content'],
+        'type': msg['type'],
+        'sender_id': msg['sender_id'],
+        'created_at': msg['created_at'],
+        'project': {
+            'name': project.get('name', 'Unknown Project'),
+            'user_name': (project.get('users') or {}).get('name', 'Unknown User')
+        }
+    }
+
+
+PROJECTS = Listing(
+    "projects",
+    "id, name, description, status, created_at, user_id, users(name, email)",
+    "user_id",
+    _format_project
+)
+
+MESSAGES = Listing(
+    "messages",
+    "id, content, type, sender_id, created_at, project_id, projects!inner(name, user_id, users(name))",
+    "projects.user_id",
+    _format_message
+)
+
+USER_MESSAGES = Listing(
+    "messages",
+    "id, content, type, created_at, project_id, projects!inner(name, user_id)",
+    "projects.user_id"
+)
+
+PROJECT_MESSAGES = Listing("messages", "*", "project_id")
+
+PROJECT_UPDATES = Listing("progress_updates", "*", "project_id")
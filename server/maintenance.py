@@ -0,0 +1,128 @@
+import datetime
+import os
+import threading
+import time
+
+
+class MaintenanceScheduler:
+    """
+    Periodically purges rows that can no longer matter.
+
+    Runs in a daemon thread inside each server process and deletes in
+    batches by primary key, so a large backlog never turns into one long
+    statement. Expired blocklist entries, used or expired password resets and
+    expired refresh tokens are removed, and change log entries past their
+    retention when the change log is enabled. Other modules can add their own
+    cleanup with ``task``. The thread is started on the first request of each
+    process, which keeps it fork-safe.
+    """
+
+    def __init__(self, client, app=None):
+        self.client = client
+        self.interval = 3600
+        self.batch_size = 500
+        self.max_token_age = datetime.timedelta(hours=1)
+        self.change_log_retention = None
+        self.last_report = None
+        self._tasks = {}  # name -> callback returning how many items it removed
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.interval = app.config.setdefault("MAINTENANCE_INTERVAL_SECONDS", 3600)
+        self.batch_size = app.config.setdefault("MAINTENANCE_BATCH_SIZE", 500)
+        self.max_token_age = app.config.get("JWT_ACCESS_TOKEN_EXPIRES", self.max_token_age)
+        if app.config.get("CHANGE_LOG_ENABLED"):
+            self.change_log_retention = datetime.timedelta(days=app.config.get("CHANGE_LOG_RETENTION_DAYS", 30))
+        if app.config.setdefault("MAINTENANCE_ENABLED", True):
+            app.before_request(self.ensure_started)
+        app.extensions["maintenance"] = self
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="maintenance", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def task(self, name, callback):
+        self._tasks[name] = callback
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Error in maintenance run: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def run_once(self):
+        start = time.perf_counter()
+        now = datetime.datetime.utcnow()
+        now_iso = now.isoformat()
+
+        removed = {
+            "token_blacklist": self._purge(
+                "token_blacklist",
+                lambda query: query.lt("expires_at", now_iso)
+            ),
+            # Entradas anteriores a expires_at: ningún token dura más que el access token
+            "token_blacklist_legacy": self._purge(
+                "token_blacklist",
+                lambda query: query.is_("expires_at", "null").lt("created_at", (now - self.max_token_age).isoformat())
+            ),
+            "password_resets": self._purge(
+                "password_resets",
+                lambda query: query.or_(f'used.eq.true,expires_at.lt."{now_iso}"')
+            ),
+            "refresh_tokens": self._purge(
+                "refresh_tokens",
+                lambda query: query.lt("expires_at", now_iso),
+                key="jti"
+            ),
+        }
+        if self.change_log_retention is not None:
+            # Un token de /api/sync más viejo que la retención recibe 410 y el cliente recarga todo
+            removed["change_log"] = self._purge(
+                "change_log",
+                lambda query: query.lt("created_at", (now - self.change_log_retention).isoformat())
+            )
+
+        for name, callback in self._tasks.items():
+            # A failing task does not stop the others or the report
+            try:
+                removed[name] = callback()
+            except Exception as e:
+                print(f"Error in maintenance task {name}: {str(e)}")
+                removed[name] = {"error": str(e)}
+
+        self.last_report = {
+            "finished_at": datetime.datetime.utcnow().isoformat(),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+            "removed": removed,
+        }
+        print(f"Maintenance: removed {removed} in {self.last_report['duration_ms']} ms")
+        return self.last_report
+
+    def _purge(self, table, where, key="id"):
+        total = 0
+        while True:
+            batch = where(self.client.table(table).select(key)).limit(self.batch_size).execute()
+            keys = [row[key] for row in batch.data]
+            if not keys:
+                return total
+            self.client.table(table).delete().in_(key, keys).execute()
+            total += len(keys)
+            if len(keys) < self.batch_size:
+                return total
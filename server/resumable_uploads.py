@@ -0,0 +1,299 @@
+import datetime
+import json
+import mimetypes
+import os
+import re
+import secrets
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: el bloqueo solo cubre al proceso actual
+    fcntl = None
+
+UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+COPY_BLOCK = 64 * 1024
+
+
+class UploadError(Exception):
+    """Base error of a resumable upload; ``status`` is the HTTP status to answer with."""
+
+    status = 400
+
+    def __init__(self, message, offset=None):
+        super().__init__(message)
+        self.offset = offset
+
+
+class UploadNotFound(UploadError):
+    status = 404
+
+
+class UploadExpired(UploadError):
+    status = 410
+
+
+class UploadConflict(UploadError):
+    # Wrong offset, a chunk already being written, or finalizing before the last byte
+    status = 409
+
+
+class ChunkTooLarge(UploadError):
+    status = 413
+
+
+class ResumableUploads:
+    """
+    Resumable uploads staged on local disk and sent to storage once complete.
+
+    A session (``create``) records the project, user, file and declared size
+    in ``<UPLOAD_STAGING_DIR>/<upload_id>.json``; the bytes received so far
+    live in ``<upload_id>.part``, whose size is the session offset. Each chunk
+    is appended at the offset the client claims (``append``), written as it
+    arrives, so a dropped connection keeps everything received up to that
+    point and the client resumes from ``status``. ``finalize`` streams the
+    complete file to storage; ``complete`` also records and discards it
+    under the same lock. A session untouched for
+    ``UPLOAD_STAGING_TTL_SECONDS`` is expired and deleted by
+    ``purge_expired``.
+
+    Sessions are plain files, so every worker on the host sees them; with
+    several hosts the staging directory must be shared or the requests of a
+    session routed to the same host.
+    """
+
+    def __init__(self, buckets, bucket_name, app=None):
+        self.buckets = buckets
+        self.bucket_name = bucket_name
+        self.directory = os.path.join(tempfile.gettempdir(), "vitrine-uploads")
+        self.ttl = 86400
+        self.chunk_max_bytes = 8 * 1024 * 1024
+        self._busy = set()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directory = app.config.setdefault("UPLOAD_STAGING_DIR", self.directory)
+        self.ttl = app.config.setdefault("UPLOAD_STAGING_TTL_SECONDS", 86400)
+        self.chunk_max_bytes = app.config.setdefault("UPLOAD_CHUNK_MAX_BYTES", 8 * 1024 * 1024)
+        app.extensions["resumable_uploads"] = self
+
+    def create(self, project_id, user_id, role, filename, size):
+        os.makedirs(self.directory, exist_ok=True)
+        upload_id = secrets.token_hex(16)
+        session = {
+            "upload_id": upload_id,
+            "project_id": str(project_id),
+            "user_id": str(user_id),
+            "role": role,
+            "filename": filename,
+            "content_type": mimetypes.guess_type(filename)[0] or "application/octet-stream",
+            "size": size,
+            "created_at": time.time(),
+        }
+        # The .part file is created first: a .json without it is never left visible
+        open(self._part_path(upload_id), "xb").close()
+        with open(self._meta_path(upload_id), "x", encoding="utf-8") as handle:
+            json.dump(session, handle)
+        return self._describe(session, 0)
+
+    def status(self, upload_id, project_id, user_id):
+        session = self._load(upload_id, project_id, user_id)
+        return self._describe(session, os.path.getsize(self._part_path(upload_id)))
+
+    def append(self, upload_id, project_id, user_id, offset, stream, length):
+        """
+        Writes ``length`` bytes read from ``stream`` at ``offset``. Returns
+        the session status. If reading stops early, the bytes already
+        received stay and the error is raised again.
+        """
+        if length > self.chunk_max_bytes:
+            raise ChunkTooLarge(f"Cada parte admite hasta {self.chunk_max_bytes} bytes")
+
+        with self._locked(upload_id) as part:
+            session = self._load(upload_id, project_id, user_id)
+            current = os.fstat(part.fileno()).st_size
+            if offset != current:
+                raise UploadConflict("El offset no coincide con lo recibido", offset=current)
+            if current + length > session["size"]:
+                raise ChunkTooLarge("La parte supera el tamaño declarado", offset=current)
+
+            remaining = length
+            try:
+                while remaining:
+                    block = stream.read(min(remaining, COPY_BLOCK))
+                    if not block:
+                        break
+                    part.write(block)
+                    remaining -= len(block)
+            finally:
+                part.flush()
+            return self._describe(session, os.fstat(part.fileno()).st_size)
+
+    def finalize(self, upload_id, project_id, user_id, path):
+        """
+        Uploads the complete file to storage at ``path``; the staged copy is
+        kept until ``discard`` so a failed database insert can be retried.
+        """
+        with self._locked(upload_id) as part:
+            return self._finalize(upload_id, project_id, user_id, path, part)
+
+    def complete(self, upload_id, project_id, user_id, path, record):
+        """
+        ``finalize``, then ``record(upload)`` and ``discard``, all under the
+        session lock, so two concurrent or retried calls for one session
+        cannot both record it. ``record`` stores the upload (e.g. the database
+        row) and returns it, or returns None on failure, which keeps the
+        staged copy for a retry. Returns ``(upload, recorded)``.
+        """
+        with self._locked(upload_id) as part:
+            upload = self._finalize(upload_id, project_id, user_id, path, part)
+            recorded = record(upload)
+            if recorded:
+                self.discard(upload_id)
+            return upload, recorded
+
+    def cancel(self, upload_id, project_id, user_id):
+        # Waits for no chunk: a session receiving one answers UploadConflict
+        with self._locked(upload_id):
+            self._load(upload_id, project_id, user_id)
+            self.discard(upload_id)
+
+    def discard(self, upload_id):
+        with self._lock:
+            for file_path in (self._meta_path(upload_id), self._part_path(upload_id)):
+                try:
+                    os.unlink(file_path)
+                except FileNotFoundError:
+                    pass
+
+    def purge_expired(self):
+        # Called by the maintenance thread; returns how many sessions were removed
+        if not os.path.isdir(self.directory):
+            return 0
+        removed = 0
+        for name in os.listdir(self.directory):
+            upload_id, extension = os.path.splitext(name)
+            if extension != ".json" or not UPLOAD_ID.match(upload_id) or not self._expired(upload_id):
+                continue
+            try:
+                with self._locked(upload_id):
+                    if not self._expired(upload_id):
+                        continue  # a chunk arrived since the check
+                    self.discard(upload_id)
+            except UploadConflict:
+                continue  # a chunk is arriving right now
+            except UploadNotFound:
+                self.discard(upload_id)  # metadata left without its .part
+            removed += 1
+        return removed
+
+    def _finalize(self, upload_id, project_id, user_id, path, part):
+        # Called with the session lock held; part is the locked .part file
+        session = self._load(upload_id, project_id, user_id)
+        received = os.fstat(part.fileno()).st_size
+        if received != session["size"]:
+            raise UploadConflict("Faltan partes por subir", offset=received)
+
+        def upload(bucket):
+            # Reopened per attempt: call() may retry after re-provisioning the bucket
+            with open(self._part_path(upload_id), "rb") as source:
+                return bucket.upload(path=path, file=source, file_options={
+                    "content-type": session["content_type"],
+                    "upsert": "true",
+                })
+
+        self.buckets.call(self.bucket_name, upload)
+        url = self.buckets.client.storage.from_(self.bucket_name).get_public_url(path)
+        return {**self._describe(session, received), "path": path, "url": url}
+
+    def _describe(self, session, offset):
+        return {
+            "upload_id": session["upload_id"],
+            "role": session["role"],
+            "filename": session["filename"],
+            "content_type": session["content_type"],
+            "size": session["size"],
+            "offset": offset,
+            "complete": offset == session["size"],
+            "chunk_max_bytes": self.chunk_max_bytes,
+            "expires_at": datetime.datetime.utcfromtimestamp(
+                self._last_activity(session["upload_id"]) + self.ttl
+            ).isoformat(),
+        }
+
+    def _load(self, upload_id, project_id, user_id):
+        if not UPLOAD_ID.match(upload_id or ""):
+            raise UploadNotFound("Sesión de subida no encontrada")
+        try:
+            with open(self._meta_path(upload_id), encoding="utf-8") as handle:
+                session = json.load(handle)
+        except (FileNotFoundError, ValueError):
+            raise UploadNotFound("Sesión de subida no encontrada")
+        # Another user's or project's session is reported as missing, not forbidden
+        if session["project_id"] != str(project_id) or session["user_id"] != str(user_id):
+            raise UploadNotFound("Sesión de subida no encontrada")
+        if self._expired(upload_id):
+            raise UploadExpired("La sesión de subida expiró")
+        return session
+
+    def _expired(self, upload_id):
+        try:
+            return self._last_activity(upload_id) + self.ttl < time.time()
+        except FileNotFoundError:
+            return True
+
+    def _last_activity(self, upload_id):
+        return os.path.getmtime(self._part_path(upload_id))
+
+    def _locked(self, upload_id):
+        return _SessionLock(self, upload_id)
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.directory, f"{upload_id}.json")
+
+    def _part_path(self, upload_id):
+        return os.path.join(self.directory, f"{upload_id}.part")
+
+
+class _SessionLock:
+    # One writer per session: a set for the threads of this process, flock for the other workers
+    def __init__(self, uploads, upload_id):
+        self.uploads = uploads
+        self.upload_id = upload_id
+        self.part = None
+
+    def __enter__(self):
+        if not UPLOAD_ID.match(self.upload_id or ""):
+            raise UploadNotFound("Sesión de subida no encontrada")
+        with self.uploads._lock:
+            if self.upload_id in self.uploads._busy:
+                raise UploadConflict("Ya se está recibiendo una parte de esta subida")
+            self.uploads._busy.add(self.upload_id)
+        try:
+            # Without O_CREAT: a discarded session must not come back
+            fd = os.open(self.uploads._part_path(self.upload_id), os.O_WRONLY | os.O_APPEND)
+            self.part = os.fdopen(fd, "ab")
+            if fcntl is not None:
+                fcntl.flock(self.part.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except FileNotFoundError:
+            self._release()
+            raise UploadNotFound("Sesión de subida no encontrada")
+        except BlockingIOError:
+            self._release()
+            raise UploadConflict("Ya se está recibiendo una parte de esta subida")
+        return self.part
+
+    def __exit__(self, *exc):
+        self._release()
+        return False
+
+    def _release(self):
+        if self.part is not None:
+            self.part.close()
+            self.part = None
+        with self.uploads._lock:
+            self.uploads._busy.discard(self.upload_id)
@@ -0,0 +1,269 @@
+import datetime
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class BloomFilter:
+    """Compact set of revoked jtis. May report false positives, never false negatives."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+        self.size = max(int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hash_count = max(int(round(self.size / self.capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevocationCache:
+    """
+    Local view of the token_blacklist table.
+
+    Revoked jtis are kept in a bloom filter that is synced incrementally by
+    created_at at most once per staleness window; after a failed sync the next
+    attempt waits ``REVOCATION_SYNC_RETRY_SECONDS``. A jti that is not in the
+    filter is known to be valid without a round-trip; filter hits are confirmed
+    against the table and the answer is remembered in a bounded TTL cache.
+    """
+
+    def __init__(self, client, app=None):
+        self.client = client
+        self.staleness = 30
+        self.retry_interval = 5
+        self.known_ttl = 300
+        self.known_max_entries = 10000
+        self.error_rate = 0.001
+        self.page_size = 1000
+        self.sync_overlap = datetime.timedelta(seconds=5)
+
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._bloom = None
+        self._known = OrderedDict()  # jti -> (revoked, expires_at)
+        self._watermark = None
+        self._last_sync = 0.0
+        self._retry_at = 0.0
+        self._synced = False
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.staleness = app.config.setdefault("REVOCATION_STALENESS_SECONDS", 30)
+        self.retry_interval = app.config.setdefault("REVOCATION_SYNC_RETRY_SECONDS", 5)
+        self.known_ttl = app.config.setdefault("REVOCATION_KNOWN_TTL_SECONDS", 300)
+        self.known_max_entries = app.config.setdefault("REVOCATION_KNOWN_MAX_ENTRIES", 10000)
+        self.error_rate = app.config.setdefault("REVOCATION_BLOOM_ERROR_RATE", 0.001)
+        self._bloom = BloomFilter(app.config.setdefault("REVOCATION_BLOOM_CAPACITY", 100000), self.error_rate)
+        app.extensions["revocation_cache"] = self
+
+    def is_revoked(self, jti):
+        self._maybe_sync()
+
+        with self._lock:
+            # Until the first sync succeeds the filter cannot vouch for anything
+            if self._synced and jti not in self._bloom:
+                return False
+            cached = self._known.get(jti)
+            if cached is not None and cached[1] > time.monotonic():
+                self._known.move_to_end(jti)
+                return cached[0]
+
+        # Bloom hit without a fresh answer: confirm against the table
+        response = self.client.table("token_blacklist").select("jti").eq("jti", jti).execute()
+        revoked = len(response.data) > 0
+        self._remember(jti, revoked)
+        return revoked
+
+    def revoke(self, jti):
+        # Effective immediately in this process; other processes see it on their next sync
+        with self._lock:
+            self._bloom.add(jti)
+        self._remember(jti, True)
+
+    def _remember(self, jti, revoked):
+        with self._lock:
+            self._known[jti] = (revoked, time.monotonic() + self.known_ttl)
+            self._known.move_to_end(jti)
+            while len(self._known) > self.known_max_entries:
+                self._known.popitem(last=False)
+
+    def _maybe_sync(self):
+        now = time.monotonic()
+        if now - self._last_sync < self.staleness or now < self._retry_at:
+            return
+        # Only one thread syncs; the rest keep answering from the current snapshot
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self.sync()
+        except Exception as e:
+            print(f"Error syncing token_blacklist: {str(e)}")
+            # Back off instead of retrying on every request while the table is unreachable
+            self._retry_at = time.monotonic() + self.retry_interval
+        finally:
+            self._sync_lock.release()
+
+    def sync(self):
+        rows = self._fetch_since(self._watermark)
+
+        rebuild = None
+        if self._bloom.count + len(rows) > self._bloom.capacity:
+            # The filter is about to exceed the size it was built for; start
+            # over from the whole table with room to grow.
+            rows = self._fetch_since(None)
+            rebuild = BloomFilter(max(self._bloom.capacity, len(rows)) * 2, self.error_rate)
+
+        with self._lock:
+            if rebuild is not None:
+                for jti, (revoked, _) in self._known.items():
+                    if revoked:
+                        rebuild.add(jti)
+                self._bloom = rebuild
+            for row in rows:
+                if row["jti"] not in self._bloom:
+                    self._bloom.add(row["jti"])
+                # A jti remembered as valid may have been revoked elsewhere
+                cached = self._known.get(row["jti"])
+                if cached is not None and not cached[0]:
+                    del self._known[row["jti"]]
+                created_at = _parse_timestamp(row["created_at"])
+                if self._watermark is None or created_at > self._watermark:
+                    self._watermark = created_at
+            self._last_sync = time.monotonic()
+            self._synced = True
+
+        return len(rows)
+
+    def _fetch_since(self, watermark):
+        rows = []
+        offset = 0
+        while True:
+            query = self.client.table("token_blacklist").select("jti, created_at")
+            if watermark is not None:
+                # Overlap the window so rows committed late with an older created_at are not missed
+                query = query.gte("created_at", (watermark - self.sync_overlap).isoformat())
+            page = query.order("created_at").order("id").range(offset, offset + self.page_size - 1).execute()
+            rows.extend(page.data)
+            if len(page.data) < self.page_size:
+                return rows
+            offset += self.page_size
+
+
+def _parse_timestamp(value):
+    parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed
+
+
+class TokenGenerations:
+    """
+    Per-user token generation numbers from users.token_generation.
+
+    Tokens carry the generation they were issued under in the "gen" claim.
+    Bumping a user's generation invalidates every token issued before it in a
+    single update, without a row per token. Only users that have ever been
+    bumped are kept in memory, and the map is reloaded in bulk at most once
+    per staleness window (or per retry interval after a failed reload).
+    """
+
+    def __init__(self, client, app=None):
+        self.client = client
+        self.staleness = 30
+        self.retry_interval = 5
+        self.page_size = 1000
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._generations = {}
+        self._last_sync = 0.0
+        self._retry_at = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.staleness = app.config.setdefault("REVOCATION_STALENESS_SECONDS", 30)
+        self.retry_interval = app.config.setdefault("REVOCATION_SYNC_RETRY_SECONDS", 5)
+        app.extensions["token_generations"] = self
+
+    def current(self, user_id):
+        self._maybe_sync()
+        with self._lock:
+            return self._generations.get(str(user_id), 0)
+
+    def is_stale(self, user_id, generation):
+        return (generation or 0) < self.current(user_id)
+
+    def bump(self, user_id, attempts=5):
+        for _ in range(attempts):
+            row = self.client.table("users").select("token_generation").eq("id", user_id).execute()
+            if not row.data:
+                raise ValueError("Usuario no encontrado")
+            current = row.data[0].get("token_generation") or 0
+            # Compare-and-set so two concurrent bumps cannot collapse into one
+            updated = self.client.table("users").update({"token_generation": current + 1}) \
+                .eq("id", user_id).eq("token_generation", current).execute()
+            if updated.data:
+                with self._lock:
+                    key = str(user_id)
+                    self._generations[key] = max(self._generations.get(key, 0), current + 1)
+                return current + 1
+        raise RuntimeError("No se pudo actualizar la generación de tokens")
+
+    def observe(self, user_id, generation):
+        # A generation seen elsewhere (e.g. in a change feed event); it only ever grows
+        with self._lock:
+            key = str(user_id)
+            self._generations[key] = max(self._generations.get(key, 0), generation or 0)
+
+    def _maybe_sync(self):
+        now = time.monotonic()
+        if now - self._last_sync < self.staleness or now < self._retry_at:
+            return
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self.sync()
+        except Exception as e:
+            print(f"Error syncing token generations: {str(e)}")
+            self._retry_at = time.monotonic() + self.retry_interval
+        finally:
+            self._sync_lock.release()
+
+    def sync(self):
+        generations = {}
+        offset = 0
+        while True:
+            page = self.client.table("users").select("id, token_generation").gt("token_generation", 0) \
+                .order("id").range(offset, offset + self.page_size - 1).execute()
+            for row in page.data:
+                generations[str(row["id"])] = row["token_generation"]
+            if len(page.data) < self.page_size:
+                break
+            offset += self.page_size
+
+        with self._lock:
+            # Keep local bumps that the snapshot may have raced with
+            for user_id, generation in self._generations.items():
+                if generation > generations.get(user_id, 0):
+                    generations[user_id] = generation
+            self._generations = generations
+            self._last_sync = time.monotonic()
+        return len(generations)
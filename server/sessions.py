@@ -0,0 +1,49 @@
+import datetime
+
+
+class RefreshSessionStore:
+    """
+    Bookkeeping for refresh-token rotation in the refresh_tokens table.
+
+    Every login starts a family (one per device). Each refresh consumes the
+    presented token and issues the next one in the same family; presenting an
+    already-consumed token is treated as theft and revokes the whole family.
+    All lookups go through the jti primary key or the family_id index.
+    """
+
+    ROTATED = "rotated"
+    REUSED = "reused"
+    INVALID = "invalid"
+
+    def __init__(self, client):
+        self.client = client
+
+    def start(self, jti, family_id, user_id, expires_at):
+        self.client.table("refresh_tokens").insert({
+            "jti": jti,
+            "family_id": family_id,
+            "user_id": user_id,
+            "expires_at": expires_at.isoformat(),
+            "used_at": None,
+            "revoked": False,
+            "created_at": datetime.datetime.utcnow().isoformat()
+        }).execute()
+
+    def consume(self, jti):
+        now = datetime.datetime.utcnow().isoformat()
+        # Conditional update: only one concurrent refresh can claim the token
+        claimed = self.client.table("refresh_tokens").update({"used_at": now}) \
+            .eq("jti", jti).eq("revoked", False).is_("used_at", "null").execute()
+        if claimed.data:
+            return self.ROTATED, claimed.data[0]
+
+        row = self.client.table("refresh_tokens").select("family_id, used_at, revoked").eq("jti", jti).execute()
+        if not row.data:
+            return self.INVALID, None
+        if row.data[0]["used_at"] and not row.data[0]["revoked"]:
+            self.revoke_family(row.data[0]["family_id"])
+            return self.REUSED, row.data[0]
+        return self.INVALID, row.data[0]
+
+    def revoke_family(self, family_id):
+        self.client.table("refresh_tokens").update({"revoked": True}).eq("family_id", family_id).execute()
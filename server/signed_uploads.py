@@ -0,0 +1,175 @@
+import datetime
+import mimetypes
+import os
+import re
+from uuid import uuid4
+
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+PROJECT_FOLDER = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+UPLOAD_FOLDER = re.compile(r"^[0-9a-f]{32}$")
+LIST_PAGE_SIZE = 100
+
+
+class UploadSessionError(Exception):
+    """Raised when an upload session token is invalid, expired or its files are missing."""
+
+    def __init__(self, message, missing=None):
+        super().__init__(message)
+        self.missing = missing or []
+
+
+class SignedUploads:
+    """
+    Two-phase uploads that go straight from the browser to storage.
+
+    ``init`` asks storage for one signed upload URL per file, each under a
+    folder of its own (``<project_id>/<upload_id>/``), and returns them with a
+    session token: the project, user and expected files, signed with the JWT
+    secret, so no server state is kept between the two phases. ``complete``
+    checks the token and lists that folder once to verify every expected
+    object was uploaded. The file bytes never pass through the app.
+
+    A session never completed leaves its folder behind; ``purge_abandoned``
+    (a maintenance task) deletes the folders older than
+    ``UPLOAD_SESSION_MAX_AGE_SECONDS`` that no ``contracts`` row points to.
+    """
+
+    def __init__(self, buckets, bucket_name, app=None):
+        self.buckets = buckets
+        self.bucket_name = bucket_name
+        self.max_age = 7200
+        self._serializer = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # Storage's signed upload URLs are valid for two hours
+        self.max_age = app.config.setdefault("UPLOAD_SESSION_MAX_AGE_SECONDS", 7200)
+        self._serializer = URLSafeTimedSerializer(app.config["JWT_SECRET_KEY"], salt="signed-upload")
+        app.extensions["signed_uploads"] = self
+
+    def init(self, project_id, user_id, files):
+        """
+        ``files``: ``[{"role": ..., "filename": ...}]``. Returns the session
+        token and, per file, the path and signed URL to upload it to.
+        """
+        upload_id = uuid4().hex
+        issued = []
+        for file in files:
+            extension = os.path.splitext(file["filename"])[1].lower()
+            path = f"{project_id}/{upload_id}/{file['role']}{extension}"
+            signed = self.buckets.call(self.bucket_name, lambda bucket: bucket.create_signed_upload_url(path))
+            issued.append({
+                "role": file["role"],
+                "filename": file["filename"],
+                "path": path,
+                "content_type": mimetypes.guess_type(path)[0] or "application/octet-stream",
+                "signed_url": signed["signed_url"],
+                "token": signed["token"],
+            })
+
+        session = self._serializer.dumps({
+            "project_id": str(project_id),
+            "user_id": str(user_id),
+            "upload_id": upload_id,
+            "files": {file["role"]: file["path"] for file in issued},
+        })
+        return {"upload_id": upload_id, "session": session, "expires_in": self.max_age, "files": issued}
+
+    def complete(self, session, project_id, user_id):
+        """
+        Verifies a session of ``project_id`` opened by ``user_id`` and returns
+        ``{role: {"path", "url", "size", "content_type"}}`` for its files.
+        """
+        try:
+            data = self._serializer.loads(session, max_age=self.max_age)
+        except SignatureExpired:
+            raise UploadSessionError("La sesión de subida expiró")
+        except BadSignature:
+            raise UploadSessionError("Sesión de subida inválida")
+        if data["project_id"] != str(project_id) or data["user_id"] != str(user_id):
+            raise UploadSessionError("Sesión de subida inválida")
+
+        folder = f"{project_id}/{data['upload_id']}"
+        listed = self.buckets.call(self.bucket_name, lambda bucket: bucket.list(folder))
+        objects = {f"{folder}/{entry['name']}": entry for entry in listed or []}
+
+        missing = [role for role, path in data["files"].items() if path not in objects]
+        if missing:
+            raise UploadSessionError("Faltan archivos por subir", missing)
+
+        storage = self.buckets.client.storage.from_(self.bucket_name)
+        result = {}
+        for role, path in data["files"].items():
+            metadata = objects[path].get("metadata") or {}
+            result[role] = {
+                "path": path,
+                "url": storage.get_public_url(path),
+                "size": metadata.get("size"),
+                "content_type": metadata.get("mimetype"),
+            }
+        return result
+
+    def purge_abandoned(self):
+        """
+        Deletes session folders whose token has expired and that no contract
+        references. Returns how many folders were removed.
+        """
+        cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=self.max_age)
+        removed = 0
+        for project in self._list(""):
+            # Root entries without an id are folders; files at the root belong to the other upload routes
+            project_id = project["name"]
+            if project.get("id") is not None or not PROJECT_FOLDER.match(project_id):
+                continue
+            referenced = None
+            for folder in self._list(project_id):
+                upload_id = folder["name"]
+                if folder.get("id") is not None or not UPLOAD_FOLDER.match(upload_id):
+                    continue
+                files = [entry for entry in self._list(f"{project_id}/{upload_id}") if entry.get("id") is not None]
+                if any(_created_at(entry) > cutoff for entry in files):
+                    continue
+                if referenced is None:
+                    referenced = self._referenced_folders(project_id)
+                if upload_id in referenced:
+                    continue
+                paths = [f"{project_id}/{upload_id}/{entry['name']}" for entry in files]
+                if paths:
+                    self.buckets.call(self.bucket_name, lambda bucket: bucket.remove(paths))
+                removed += 1
+        return removed
+
+    def _list(self, path):
+        entries = []
+        while True:
+            page = self.buckets.call(self.bucket_name, lambda bucket: bucket.list(
+                path, {"limit": LIST_PAGE_SIZE, "offset": len(entries)}
+            )) or []
+            entries.extend(page)
+            if len(page) < LIST_PAGE_SIZE:
+                return entries
+
+    def _referenced_folders(self, project_id):
+        # Upload ids whose folder a contract row links to (contract_url or payment_url)
+        response = self.buckets.client.table("contracts") \
+            .select("contract_url, payment_url") \
+            .eq("project_id", project_id) \
+            .execute()
+        prefix = f"/{project_id}/"
+        referenced = set()
+        for row in response.data or []:
+            for url in (row.get("contract_url"), row.get("payment_url")):
+                if url and prefix in url:
+                    referenced.add(url.split(prefix, 1)[1].split("/", 1)[0])
+        return referenced
+
+
+def _created_at(entry):
+    # Storage returns ISO timestamps with a trailing Z
+    value = entry.get("created_at") or entry.get("updated_at")
+    if not value:
+        return datetime.datetime.now(datetime.timezone.utc)
+    created = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return created if created.tzinfo else created.replace(tzinfo=datetime.timezone.utc)
@@ -0,0 +1,139 @@
+import threading
+
+
+def is_bucket_not_found(error):
+    # storage3 raises StorageException with the API's JSON body (or a message) as its argument
+    detail = error.args[0] if error.args else ""
+    if isinstance(detail, dict):
+        detail = f"{detail.get('error', '')} {detail.get('message', '')}"
+    return "bucket not found" in str(detail).lower()
+
+
+def _already_exists(error):
+    detail = error.args[0] if error.args else ""
+    if isinstance(detail, dict):
+        detail = f"{detail.get('error', '')} {detail.get('message', '')} {detail.get('statusCode', '')}"
+    detail = str(detail).lower()
+    return "already exists" in detail or "409" in detail
+
+
+class BucketProvisioner:
+    """
+    Makes sure the storage buckets the app uploads to exist with the right options.
+
+    Buckets are declared with ``bucket`` and checked once, by ``provision`` at
+    startup or by ``ensure`` on first use: a missing bucket is created. An
+    existing one whose public flag, size limit or MIME types differ is only
+    logged, since those options may have been set by hand in the dashboard;
+    with ``STORAGE_ENFORCE_BUCKET_OPTIONS`` it is updated instead. The result is remembered per process (workers forked after
+    ``provision`` inherit it), so uploads make no extra storage calls. A
+    bucket is only checked again when an operation run through ``call`` fails
+    with "bucket not found".
+    """
+
+    def __init__(self, client, app=None):
+        self.client = client
+        self.file_size_limit = 52428800  # 50MB
+        self.allowed_mime_types = ["image/jpeg", "image/png", "application/pdf"]
+        self.enforce_options = False
+        self._buckets = {}  # name -> options
+        self._ready = set()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # Defaults for buckets declared without their own limits
+        self.file_size_limit = app.config.setdefault("STORAGE_FILE_SIZE_LIMIT", 52428800)
+        self.allowed_mime_types = list(app.config.setdefault(
+            "STORAGE_ALLOWED_MIME_TYPES", ["image/jpeg", "image/png", "application/pdf"]
+        ))
+        self.enforce_options = app.config.setdefault("STORAGE_ENFORCE_BUCKET_OPTIONS", False)
+        app.extensions["storage_buckets"] = self
+
+    def bucket(self, name, public=False, file_size_limit=None, allowed_mime_types=None):
+        self._buckets[name] = {
+            "public": public,
+            "file_size_limit": file_size_limit,
+            "allowed_mime_types": allowed_mime_types,
+        }
+
+    def options(self, name):
+        options = dict(self._buckets[name])
+        if options["file_size_limit"] is None:
+            options["file_size_limit"] = self.file_size_limit
+        if options["allowed_mime_types"] is None:
+            options["allowed_mime_types"] = self.allowed_mime_types
+        return options
+
+    def provision(self):
+        # Checks every declared bucket; failures are retried on first use
+        results = {}
+        for name in self._buckets:
+            try:
+                self.ensure(name)
+                results[name] = True
+            except Exception as e:
+                print(f"Error provisioning bucket {name}: {str(e)}")
+                results[name] = False
+        return results
+
+    def ensure(self, name):
+        if name in self._ready:
+            return
+        with self._lock:
+            if name in self._ready:
+                return
+            self._verify(name)
+            self._ready.add(name)
+
+    def forget(self, name):
+        self._ready.discard(name)
+
+    def call(self, name, operation):
+        # operation(bucket) where bucket is the storage3 file API of the bucket
+        self.ensure(name)
+        try:
+            return operation(self.client.storage.from_(name))
+        except Exception as e:
+            if not is_bucket_not_found(e):
+                raise
+            print(f"Bucket {name} not found, provisioning it again")
+            self.forget(name)
+            self.ensure(name)
+            return operation(self.client.storage.from_(name))
+
+    def _verify(self, name):
+        from storage3.utils import StorageException
+
+        options = self.options(name)
+        try:
+            current = self.client.storage.get_bucket(name)
+        except StorageException as e:
+            if not is_bucket_not_found(e):
+                raise
+            try:
+                self.client.storage.create_bucket(name, options=options)
+                print(f"Created bucket: {name}")
+            except StorageException as e:
+                # Another process created it first
+                if not _already_exists(e):
+                    raise
+            return
+
+        differences = [
+            f"{option}: {found!r} (config {wanted!r})"
+            for option, found, wanted in (
+                ("public", bool(current.public), options["public"]),
+                ("file_size_limit", current.file_size_limit, options["file_size_limit"]),
+                ("allowed_mime_types", sorted(current.allowed_mime_types or []), sorted(options["allowed_mime_types"] or [])),
+            )
+            if found != wanted
+        ]
+        if not differences:
+            return
+        if self.enforce_options:
+            self.client.storage.update_bucket(name, options)
+            print(f"Updated bucket options: {name} ({'; '.join(differences)})")
+        else:
+            print(f"Bucket {name} options differ from the config, left as they are: {'; '.join(differences)}")
@@ -0,0 +1,57 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask_jwt_extended import JWTManager
+
+
+class CachingJWTManager(JWTManager):
+    """
+    JWTManager that remembers the claims of tokens it has already verified.
+
+    Entries are keyed by a digest of the raw token and dropped once the token
+    reaches its exp, so a cached token is never accepted past its lifetime.
+    Only the signature check and JSON decoding are skipped: the blocklist and
+    claims verification callbacks still run on every request.
+
+    ``_decode_jwt_from_config`` is a private hook of flask_jwt_extended, so the
+    package is pinned in requirements.txt; check it still exists (and is what
+    ``decode_token`` and ``verify_jwt_in_request`` call) before upgrading.
+    """
+
+    def __init__(self, app=None, add_context_processor=False):
+        self._decode_cache = OrderedDict()  # sha256(token) -> (claims, exp)
+        self._decode_cache_lock = threading.Lock()
+        self._decode_cache_max_entries = 4096
+        super().__init__(app, add_context_processor)
+
+    def init_app(self, app, add_context_processor=False):
+        super().init_app(app, add_context_processor)
+        self._decode_cache_max_entries = app.config.setdefault("JWT_DECODE_CACHE_MAX_ENTRIES", 4096)
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        if csrf_value is not None or allow_expired or not self._decode_cache_max_entries:
+            return super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+
+        key = hashlib.sha256(encoded_token.encode('utf-8')).digest()
+        now = time.time()
+        with self._decode_cache_lock:
+            cached = self._decode_cache.get(key)
+            if cached is not None:
+                if cached[1] > now:
+                    self._decode_cache.move_to_end(key)
+                    return copy.deepcopy(cached[0])
+                del self._decode_cache[key]
+
+        claims = super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+
+        exp = claims.get("exp")
+        if exp is not None:
+            with self._decode_cache_lock:
+                # Deep copies: the identity claim is a dict that callers may modify
+                self._decode_cache[key] = (copy.deepcopy(claims), exp)
+                while len(self._decode_cache) > self._decode_cache_max_entries:
+                    self._decode_cache.popitem(last=False)
+        return claims
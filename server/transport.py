@@ -0,0 +1,222 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+# Trace events that mean the request already owns a connection and is on the wire
+_SENDING = ("http11.send_request_headers.started", "http2.send_request_headers.started")
+# Time spent opening a connection is not time spent waiting for the pool
+_CONNECTING = ("connection.connect_tcp", "connection.start_tls", "http2.send_connection_init")
+
+
+class TransportSettings:
+    def __init__(self, max_connections=20, max_keepalive_connections=10, keepalive_expiry=30.0,
+                 connect_timeout=5.0, read_timeout=30.0, write_timeout=30.0, pool_timeout=10.0,
+                 http2=True, prewarm_connections=2):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        self.pool_timeout = pool_timeout
+        self.http2 = http2
+        self.prewarm_connections = prewarm_connections
+
+    def limits(self):
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry
+        )
+
+    def timeout(self):
+        return httpx.Timeout(
+            connect=self.connect_timeout,
+            read=self.read_timeout,
+            write=self.write_timeout,
+            pool=self.pool_timeout
+        )
+
+
+class PoolStats:
+    """Request counts and pool wait times for one sub-client's connection pool."""
+
+    def __init__(self, name):
+        self.name = name
+        self.pool = None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def start(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def finish(self, wait, failed):
+        with self._lock:
+            self.in_flight -= 1
+            self.errors += 1 if failed else 0
+            if wait is not None:
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+
+    def tracer(self, started_at):
+        # httpcore reports connection and send events through the "trace" extension
+        state = {"connecting_since": None, "connecting": 0.0, "wait": None}
+
+        def trace(event, info):
+            now = time.perf_counter()
+            if event.endswith(".started") and event.rsplit(".", 1)[0] in _CONNECTING:
+                state["connecting_since"] = now
+            elif event.endswith(".complete") and event.rsplit(".", 1)[0] in _CONNECTING and state["connecting_since"]:
+                state["connecting"] += now - state["connecting_since"]
+                state["connecting_since"] = None
+            elif event in _SENDING and state["wait"] is None:
+                state["wait"] = max(now - started_at - state["connecting"], 0.0)
+
+        return trace, state
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = {
+                "requests": self.requests,
+                "errors": self.errors,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "avg_wait_ms": round(self.total_wait / self.requests * 1000, 2) if self.requests else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+            }
+        if self.pool is not None:
+            connections = list(self.pool.connections)
+            snapshot["connections"] = len(connections)
+            snapshot["idle_connections"] = sum(1 for connection in connections if connection.is_idle())
+        return snapshot
+
+
+class InstrumentedTransport(httpx.HTTPTransport):
+    def __init__(self, stats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+        stats.pool = self._pool
+
+    def handle_request(self, request):
+        started_at = time.perf_counter()
+        trace, state = self.stats.tracer(started_at)
+        request.extensions["trace"] = trace
+        self.stats.start()
+        failed = True
+        try:
+            response = super().handle_request(request)
+            failed = False
+            return response
+        finally:
+            self.stats.finish(state["wait"], failed)
+
+
+class AsyncInstrumentedTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, stats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+        stats.pool = self._pool
+
+    async def handle_async_request(self, request):
+        started_at = time.perf_counter()
+        trace, state = self.stats.tracer(started_at)
+        request.extensions["trace"] = trace
+        self.stats.start()
+        failed = True
+        try:
+            response = await super().handle_async_request(request)
+            failed = False
+            return response
+        finally:
+            self.stats.finish(state["wait"], failed)
+
+
+_stats = {}
+
+
+def pool_stats():
+    return {name: stats.snapshot() for name, stats in _stats.items()}
+
+
+def _session(session_class, old_session, settings, name, asynchronous=False):
+    stats = _stats[name] = PoolStats(name)
+    transport_class = AsyncInstrumentedTransport if asynchronous else InstrumentedTransport
+    return session_class(
+        base_url=old_session.base_url,
+        headers=old_session.headers,
+        timeout=settings.timeout(),
+        follow_redirects=True,
+        transport=transport_class(stats, limits=settings.limits(), http2=settings.http2)
+    )
+
+
+def configure_postgrest(postgrest, settings):
+    old = postgrest.session
+    postgrest.session = _session(type(old), old, settings, "postgrest")
+    old.close()
+    return postgrest
+
+
+def configure_storage(storage, settings):
+    old = storage.session
+    storage.session = storage._client = _session(type(old), old, settings, "storage")
+    old.close()
+    return storage
+
+
+def configure_auth(auth, settings):
+    old = auth._http_client
+    auth._http_client = auth.admin._http_client = _session(type(old), old, settings, "auth")
+    old.close()
+    return auth
+
+
+def configure_client(client, settings):
+    """
+    Replaces the default httpx sessions of the PostgREST, storage and auth
+    sub-clients with pooled sessions built from ``settings``.
+    """
+    configure_postgrest(client.postgrest, settings)
+    configure_storage(client.storage, settings)
+    configure_auth(client.auth, settings)
+    return client
+
+
+async def configure_async_client(client, settings):
+    postgrest = client.postgrest
+    old = postgrest.session
+    postgrest.session = _session(type(old), old, settings, "postgrest_async", asynchronous=True)
+    await old.aclose()
+
+    storage = client.storage
+    old = storage.session
+    storage.session = storage._client = _session(type(old), old, settings, "storage_async", asynchronous=True)
+    await old.aclose()
+    return client
+
+
+def prewarm(client, settings):
+    # Opens connections ahead of the first request so it does not pay for TCP/TLS setup
+    count = settings.prewarm_connections
+    if count <= 0:
+        return
+
+    def touch(session):
+        try:
+            session.head("/")
+        except Exception as e:
+            print(f"Error pre-warming Supabase connection: {str(e)}")
+
+    sessions = [client.postgrest.session] * count + [client.storage.session]
+    with ThreadPoolExecutor(max_workers=len(sessions)) as executor:
+        list(executor.map(touch, sessions))
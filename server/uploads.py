@@ -0,0 +1,88 @@
+import io
+import os
+import tempfile
+from contextlib import contextmanager
+
+from flask import Request, current_app, has_app_context, request
+
+DEFAULT_SPOOL_THRESHOLD = 512 * 1024
+
+
+class SpoolingRequest(Request):
+    """
+    Request whose multipart file parts spool to disk past a configurable threshold.
+
+    Werkzeug's default stream factory already writes each file part into a
+    SpooledTemporaryFile that moves to disk past 500KB; this only makes that
+    threshold ``UPLOAD_SPOOL_THRESHOLD``, so ``upload_source`` can tell from
+    a part's size alone whether it is on disk.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=spool_threshold(), mode="rb+")
+
+
+def spool_threshold():
+    if has_app_context():
+        return current_app.config.get("UPLOAD_SPOOL_THRESHOLD", DEFAULT_SPOOL_THRESHOLD)
+    return DEFAULT_SPOOL_THRESHOLD
+
+
+def upload_body(config_key):
+    """
+    Marks a view whose request body may reach ``app.config[config_key]``;
+    every other route keeps the app-wide ``MAX_CONTENT_LENGTH``. The limit
+    is applied by ``apply_body_limit`` before the view runs.
+    """
+    def decorator(view):
+        view.body_limit = config_key
+        return view
+    return decorator
+
+
+def apply_body_limit():
+    """
+    Sets ``request.max_content_length`` for the matched view and returns
+    whether the declared body fits in it.
+    """
+    view = current_app.view_functions.get(request.endpoint)
+    config_key = getattr(view, "body_limit", None)
+    if config_key:
+        request.max_content_length = current_app.config[config_key]
+    limit = request.max_content_length
+    return request.content_length is None or limit is None or request.content_length <= limit
+
+
+@contextmanager
+def upload_source(file_storage):
+    """
+    The body of a received file in a form storage3 uploads without copying it.
+
+    A part larger than the spool threshold is already on disk and is handed
+    over as a reader on the same file, which httpx streams to storage in 64KB
+    chunks. A smaller part is still in memory and is passed as bytes.
+    """
+    stream = file_storage.stream
+    size = stream.seek(0, os.SEEK_END)
+    stream.seek(0)
+
+    # Below the threshold: fileno() would force the part to disk just to read it
+    if size <= spool_threshold():
+        yield stream.read()
+        return
+
+    try:
+        if isinstance(stream, tempfile.SpooledTemporaryFile):
+            stream.rollover()
+        fd = stream.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        yield stream.read()
+        return
+
+    # storage3 only streams BufferedReader / FileIO objects; a dup'd fd gives one
+    # without reopening the (already unlinked) temporary file
+    reader = open(os.dup(fd), "rb")
+    try:
+        yield reader
+    finally:
+        reader.close()